@@ -0,0 +1,177 @@
+import multiprocessing
+import re
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# --- ANONYMIZACE ---
+# Dva režimy: "fast" = jeden předkompilovaný regex skener (bez spaCy), "presidio" = plná NER analýza.
+# Presidio běží jako samostatná fáze pipeline: dávky textů jdou do procesů, kde je model načtený jen jednou.
+# Modul nesmí importovat Streamlit - workery ho importují ve vlastním procesu.
+
+MODE_FAST = "fast"
+MODE_PRESIDIO = "presidio"
+
+ENTITIES = ["EMAIL_ADDRESS", "PHONE_NUMBER", "IP_ADDRESS"]
+LANGUAGE = 'en'
+PASSWORD_RE = re.compile(r'(?i)(heslo|password|pwd|pass|access_token)(\s*[:=]\s*)(\S+)')
+CZ_PHONE_RE = re.compile(r'(\+?420\s?|(?:\b))(\d{3}\s?\d{3}\s?\d{3})\b')
+
+_engines = None
+_load_seconds = None
+
+def load_engines():
+    # Presidio se importuje až zde, import modulu je tak levný
+    global _engines
+    if _engines is None:
+        from presidio_analyzer import AnalyzerEngine, BatchAnalyzerEngine
+        from presidio_anonymizer import AnonymizerEngine
+        analyzer = AnalyzerEngine()
+        _engines = (analyzer, BatchAnalyzerEngine(analyzer_engine=analyzer), AnonymizerEngine())
+    return _engines
+
+def _init_worker():
+    global _load_seconds
+    started = time.perf_counter()
+    load_engines()
+    _load_seconds = time.perf_counter() - started
+
+def _worker_load_seconds():
+    return _load_seconds
+
+def pre_anonymize(text):
+    text = PASSWORD_RE.sub(r'\1\2[HESLO]', text)
+    return CZ_PHONE_RE.sub('[TELEFON]', text)
+
+def anonymize_text(text):
+    # Referenční varianta po jednom textu
+    if not text: return ""
+    analyzer, _, anonymizer = load_engines()
+    text = pre_anonymize(text)
+    results = analyzer.analyze(text=text, entities=ENTITIES, language=LANGUAGE)
+    return anonymizer.anonymize(text=text, analyzer_results=results).text
+
+def anonymize_batch(texts, batch_size=32):
+    # Dávková varianta - spaCy zpracuje texty přes nlp.pipe; výstup je shodný s anonymize_text
+    _, batch_analyzer, anonymizer = load_engines()
+    prepared = [pre_anonymize(t) if t else "" for t in texts]
+    idx = [i for i, t in enumerate(prepared) if t]
+    out = [""] * len(prepared)
+    if not idx: return out
+    results = batch_analyzer.analyze_iterator([prepared[i] for i in idx], language=LANGUAGE, entities=ENTITIES, batch_size=batch_size)
+    for i, res in zip(idx, results):
+        out[i] = anonymizer.anonymize(text=prepared[i], analyzer_results=res).text
+    return out
+
+def _timed_anonymize_batch(texts, batch_size):
+    # Ve workeru: výstup + čas zpracování dávky (pro metriky běhu)
+    started = time.perf_counter()
+    out = anonymize_batch(texts, batch_size)
+    return out, time.perf_counter() - started
+
+def verify_batch_equivalence(texts, batch_size=32):
+    # Vrací seznam (index, po_jednom, dávkově) pro texty, kde se výstupy liší
+    batch = anonymize_batch(texts, batch_size)
+    return [(i, single, b) for i, (single, b) in enumerate(zip((anonymize_text(t) for t in texts), batch)) if single != b]
+
+
+class AnonymizationPool:
+    # Pool procesů; každý worker si model načte jednou v initializeru.
+    # 'spawn' - forkovat vícevláknový proces Streamlitu není bezpečné.
+    def __init__(self, processes=2, batch_size=32):
+        self.processes = processes
+        self.batch_size = batch_size
+        self.executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker)
+        self._warm = None
+
+    def warm_up(self):
+        # Neblokující: jedna úloha na proces -> executor spustí všechny workery a ty si načtou model
+        if self._warm is None: self._warm = [self.executor.submit(_worker_load_seconds) for _ in range(self.processes)]
+        return self._warm
+
+    def is_ready(self):
+        return self._warm is not None and all(f.done() for f in self._warm)
+
+    def load_seconds(self):
+        # Nejdelší načtení modelu ve workeru (None, dokud nejsou všechny workery připravené)
+        if not self.is_ready(): return None
+        return max(((f.result() or 0.0) for f in self._warm if not f.exception()), default=None)
+
+    def submit(self, texts):
+        # Future s výstupem dávky; fut.seconds = čas anonymizace ve workeru (bez čekání ve frontě)
+        inner = self.executor.submit(_timed_anonymize_batch, list(texts), self.batch_size)
+        outer = Future()
+        outer.seconds = None
+        def _done(f):
+            try:
+                out, outer.seconds = f.result()
+                outer.set_result(out)
+            except BaseException as e: outer.set_exception(e)
+        inner.add_done_callback(_done)
+        return outer
+
+    def shutdown(self, wait=False):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# --- RYCHLÝ REŽIM (regex) ---
+# Rozpoznávač = (název, regex, náhrada). Náhrada je text, nebo funkce match -> text.
+# Pořadí určuje prioritu na stejné pozici. Vnitřní skupiny musí být nezachytávající nebo s unikátním jménem.
+def _keep_password_key(m):
+    return f"{m.group('pw_key')}{m.group('pw_sep')}[HESLO]"
+
+IBAN_COUNTRIES = set("AD AE AL AT AZ BA BE BG BH BR BY CH CR CY CZ DE DK DO EE EG ES FI FO FR GB GE GI GL GR GT HR HU IE IL IQ IS IT JO KW KZ LB LC LI LT LU LV MC MD ME MK MR MT MU NL NO PK PL PS PT QA RO RS SA SC SE SI SK SM ST SV TL TN TR UA VA VG XK".split())
+
+def _valid_iban(m):
+    # Kód země + kontrola mod 97 - jinak by se anonymizovala i čísla zásilek typu DR1234567890CZ
+    iban = m.group(0).replace(" ", "")
+    if iban[:2] not in IBAN_COUNTRIES: return m.group(0)
+    digits = "".join(str(int(c, 36)) for c in iban[4:] + iban[:4])
+    return "<IBAN_CODE>" if int(digits) % 97 == 1 else m.group(0)
+
+IPV4 = r'(?:25[0-5]|2[0-4]\d|1?\d?\d)(?:\.(?:25[0-5]|2[0-4]\d|1?\d?\d)){3}'
+DEFAULT_FAST_RECOGNIZERS = [
+    ("PASSWORD", r'(?i:(?P<pw_key>heslo|password|pwd|pass|access_token)(?P<pw_sep>\s*[:=]\s*)\S+)', _keep_password_key),
+    ("EMAIL_ADDRESS", r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}\b', "<EMAIL_ADDRESS>"),
+    ("IBAN_CODE", r'\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,4})?\b', _valid_iban),
+    ("IP_ADDRESS", rf'\b{IPV4}\b|\b(?:[0-9A-Fa-f]{{1,4}}:){{7}}[0-9A-Fa-f]{{1,4}}\b', "<IP_ADDRESS>"),
+    # CZ/SK čísla (+420/+421 nebo 9 číslic) - stejný výstup jako původní regex pro +420
+    ("CZ_SK_PHONE", r'(?:\+?42[01]\s?|\b)\d{3}\s?\d{3}\s?\d{3}\b', "[TELEFON]"),
+    ("PHONE_NUMBER", r'(?:\+|\b00)\d{1,3}[\s.-]?(?:\(\d{1,4}\)[\s.-]?)?\d{2,4}(?:[\s.-]?\d{2,4}){1,4}\b|\(\d{3}\)\s?\d{3}[\s.-]\d{4}\b', "<PHONE_NUMBER>"),
+]
+
+class FastAnonymizer:
+    # Všechny rozpoznávače v jedné alternaci -> jeden průchod textem
+    def __init__(self, recognizers=None):
+        self.recognizers = list(DEFAULT_FAST_RECOGNIZERS if recognizers is None else recognizers)
+        self._compile()
+
+    def _compile(self):
+        self.groups = {f"r{i}": repl for i, (_, _, repl) in enumerate(self.recognizers)}
+        self.regex = re.compile("|".join(f"(?P<r{i}>{pattern})" for i, (_, pattern, _) in enumerate(self.recognizers)))
+
+    def register(self, name, pattern, replacement, before=None):
+        # Přidá rozpoznávač (volitelně před rozpoznávač 'before') a přegeneruje regex
+        pos = next((i for i, r in enumerate(self.recognizers) if r[0] == before), len(self.recognizers))
+        self.recognizers.insert(pos, (name, pattern, replacement))
+        self._compile()
+
+    def _replace(self, m):
+        for group, repl in self.groups.items():
+            if m.group(group) is not None:
+                return repl(m) if callable(repl) else repl
+        return m.group(0)
+
+    def anonymize(self, text):
+        if not text: return ""
+        return self.regex.sub(self._replace, text)
+
+    def anonymize_batch(self, texts):
+        return [self.anonymize(t) for t in texts]
+
+    def submit(self, texts):
+        # Stejné rozhraní jako AnonymizationPool; regex je levný, běží rovnou ve volajícím vlákně
+        fut = Future()
+        started = time.perf_counter()
+        fut.set_result(self.anonymize_batch(texts))
+        fut.seconds = time.perf_counter() - started
+        return fut
@@ -0,0 +1,353 @@
+import argparse
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+from datetime import date
+
+from daktela_anonymizer import AnonymizationPool, FastAnonymizer, MODE_FAST, MODE_PRESIDIO, anonymize_batch, load_engines, verify_batch_equivalence
+from daktela_cache import TicketCache
+from daktela_cleaning import clean_html, cut_noise_and_signature
+from daktela_client import AdaptiveConcurrency, DaktelaClient
+from daktela_engine import ACTIVITY_TYPES, CARRIERS_DATA, DEFAULT_FETCH_WORKERS, MAX_FETCH_WORKERS, SEARCH_PAGE_SIZE, SEARCH_WORKERS, NullCache, build_search_params, identify_side, process_tickets, _identify_contact
+from daktela_export import ExportWriter, FORMAT_JSON, FORMAT_PARQUET, FORMAT_CSV
+from daktela_metrics import RunMetrics, summary_rows, write_report
+from daktela_mock import START_DATE, start_mock_process
+
+# --- BENCHMARKY ---
+# Spuštění: python daktela_bench.py anonymizer --texts 2000
+#           python daktela_bench.py cleaning --texts 5000
+#           python daktela_bench.py sides --contacts 200000
+#           python daktela_bench.py e2e --tickets 2000 --latency-ms 30 --error-rate 0.02 --workers 16
+#           python daktela_bench.py e2e --capacity 12 --retry-after 1  (adaptivní souběžnost vs. --fixed-workers)
+
+FIRST_NAMES = ["jan", "petra", "martin", "eva", "tomas", "lucie", "pavel", "jana"]
+DOMAINS = ["seznam.cz", "gmail.com", "firma.cz", "eshop.sk", "centrum.cz", "post.sk"]
+FILLER = [
+    "Dobrý den, zásilka stále nebyla doručena, prosím o prověření.",
+    "Posíláme reklamaci poškozeného balíku, fotografie jsou v příloze.",
+    "Kurýr dnes nedorazil, zákazník čekal celý den doma.",
+    "Prosím o změnu adresy doručení u objednávky.",
+    "Děkujeme za informaci, stav budeme dále sledovat.",
+]
+
+
+def _pii(rnd):
+    # Vrací (druh, hodnota) - hodnoty, které musí z výstupu zmizet
+    kind = rnd.choice(["email", "phone_cz", "phone_sk", "phone_intl", "ip", "iban", "password"])
+    if kind == "email": return kind, f"{rnd.choice(FIRST_NAMES)}.{rnd.randint(1, 999)}@{rnd.choice(DOMAINS)}"
+    if kind == "phone_cz": return kind, f"+420 {rnd.randint(601, 799)} {rnd.randint(100, 999)} {rnd.randint(100, 999)}"
+    if kind == "phone_sk": return kind, f"+421 9{rnd.randint(10, 49)} {rnd.randint(100, 999)} {rnd.randint(100, 999)}"
+    if kind == "phone_intl": return kind, f"+49 {rnd.randint(30, 89)} {rnd.randint(1000, 9999)} {rnd.randint(1000, 9999)}"
+    if kind == "ip": return kind, ".".join(str(rnd.randint(1, 254)) for _ in range(4))
+    if kind == "iban": return kind, _iban(rnd)
+    secret = "".join(rnd.choice("abcdefghijkmnpqrstuvwxyz23456789") for _ in range(10))
+    return kind, f"heslo: {secret}"
+
+
+def _iban(rnd):
+    # Platný český IBAN (kontrolní číslice mod 97)
+    bban = f"0800{rnd.randint(0, 10**16 - 1):016d}"
+    check = 98 - int(bban + "123500") % 97
+    raw = f"CZ{check:02d}{bban}"
+    return " ".join(raw[i:i + 4] for i in range(0, len(raw), 4))
+
+
+def _decoy(rnd):
+    # Údaje, které v textu zůstat mají (datum, číslo zásilky, částka)
+    return rnd.choice([f"{rnd.randint(1, 28)}.{rnd.randint(1, 12)}.2024", f"DR{rnd.randint(10**9, 10**10 - 1)}CZ", f"{rnd.randint(100, 9999)} Kč"])
+
+
+def make_corpus(n, seed=42):
+    rnd = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        planted = [_pii(rnd) for _ in range(rnd.randint(1, 4))]
+        decoys = [_decoy(rnd) for _ in range(rnd.randint(0, 2))]
+        parts = [rnd.choice(FILLER) for _ in range(rnd.randint(2, 8))]
+        parts += [f"Kontakt: {v}." for _, v in planted] + [f"Údaj: {d}." for d in decoys]
+        rnd.shuffle(parts)
+        corpus.append((" ".join(parts), planted, decoys))
+    return corpus
+
+
+def score(corpus, outputs):
+    found = total = kept = decoys = 0
+    per_kind = {}
+    for (_, planted, dec), out in zip(corpus, outputs):
+        for kind, value in planted:
+            secret = value.split(": ", 1)[1] if kind == "password" else value
+            hit = secret not in out
+            found += hit; total += 1
+            k = per_kind.setdefault(kind, [0, 0]); k[0] += hit; k[1] += 1
+        for d in dec:
+            kept += d in out; decoys += 1
+    return {"recall": found / total if total else 1.0, "decoys_kept": kept / decoys if decoys else 1.0, "per_kind": {k: v[0] / v[1] for k, v in sorted(per_kind.items())}}
+
+
+def bench_anonymizer(n_texts, batch_size=32):
+    corpus = make_corpus(n_texts)
+    texts = [c[0] for c in corpus]
+    mb = sum(len(t.encode('utf-8')) for t in texts) / (1024 * 1024)
+    results = {}
+    mismatches = []
+
+    fast = FastAnonymizer()
+    started = time.perf_counter()
+    outputs = fast.anonymize_batch(texts)
+    results["fast"] = dict(score(corpus, outputs), seconds=time.perf_counter() - started)
+
+    try:
+        started = time.perf_counter()
+        load_engines()
+        load_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        outputs = anonymize_batch(texts, batch_size)
+        results["presidio"] = dict(score(corpus, outputs), seconds=time.perf_counter() - started, load_seconds=load_seconds)
+        # Dávkový výstup musí být shodný se zpracováním po jednom textu
+        mismatches = verify_batch_equivalence(texts, batch_size)
+        print(f"dávka vs. po jednom: {len(texts) - len(mismatches)}/{len(texts)} shodných")
+        for i, single, batch in mismatches[:5]: print(f"  ROZDÍL #{i}: {single[:80]!r} != {batch[:80]!r}")
+    except (ImportError, OSError) as e:
+        print(f"presidio: přeskočeno ({e})")
+
+    for mode, r in results.items():
+        print(f"{mode:9s} {n_texts / r['seconds']:10.0f} textů/s  {mb / r['seconds']:7.2f} MB/s  recall {r['recall']:.3f}  zachováno {r['decoys_kept']:.3f}"
+              + (f"  (načtení modelu {r['load_seconds']:.1f} s)" if 'load_seconds' in r else ""))
+        print("          " + "  ".join(f"{k}={v:.2f}" for k, v in r["per_kind"].items()))
+    return not mismatches
+
+
+# --- ČIŠTĚNÍ TEXTU ---
+# Referenční (původní) implementace - zlatý standard, proti kterému se porovnává daktela_cleaning
+def clean_html_reference(raw_html):
+    if not raw_html: return ""
+    cleantext = raw_html.replace('</p>', '\n').replace('<br>', '\n').replace('<br />', '\n').replace('</div>', '\n').replace('&nbsp;', ' ')
+    cleanr = re.compile('<style.*?>.*?</style>|<script.*?>.*?</script>', re.DOTALL)
+    cleantext = re.sub(cleanr, '', cleantext)
+    cleanr = re.compile('<.*?>')
+    cleantext = re.sub(cleanr, '', cleantext)
+    cleantext = cleantext.replace('&lt;', '<').replace('&gt;', '>').replace('&amp;', '&')
+    patterns = [r'From:.*', r'Dne\s.*\snapsal/a:', r'----------\s*Původní zpráva\s*----------', r'On\s.*\swrote:', r'____________________________________________']
+    for pattern in patterns:
+        cleantext = re.split(pattern, cleantext, flags=re.IGNORECASE)[0]
+    cleantext = re.sub(r'\n\s*\n', '\n\n', cleantext)
+    return cleantext.strip()
+
+def cut_reference(cleaned):
+    noise_patterns = [r"Potvrzujeme, že Vaše zpráva byla úspěšně doručena", r"Jelikož Vám chceme poskytnout nejlepší servis", r"dnes ve dnech .* čerpám dovolenou"]
+    combined_cut_regex = re.compile(r"(S pozdravem|S pozdravom|Kind regards|Regards|S přáním pěkného dne|S přáním hezkého dne|Děkuji\n|Ďakujem\n|Díky\n|Tento e-mail nepředstavuje nabídku|Pro případ, že tato zpráva obsahuje návrh smlouvy|Disclaimer:|Confidentiality Notice:|Myslete na životní prostředí|Please think about the environment|-{5,}|_{5,}|---------- Odpovězená zpráva ----------|Dne .* odesílatel .* napsal\(a\):|Od: .* Posláno: .*|---------- Původní e-mail ----------)", re.IGNORECASE | re.MULTILINE)
+    if any(re.search(p, cleaned, re.IGNORECASE) for p in noise_patterns): return "[AUTOMATICKÝ EMAIL BALÍKOBOTU]"
+    match = combined_cut_regex.search(cleaned)
+    if match: cleaned = cleaned[:match.start()].strip() + "\n\n[PODPIS]"
+    return cleaned
+
+HTML_HEAD = "<html><head><style type='text/css'>p {{ margin: 0; }}\n.x {{ color: red; }}</style></head><body>"
+SIGNATURES = ["S pozdravem<br>Jan Novák<br>Balíkobot s.r.o.", "Kind regards,<br />John", "Děkuji\n", "------<br>Disclaimer: tento e-mail je důvěrný", ""]
+QUOTES = ["<div>From: zakaznik@eshop.cz<br>Sent: pondělí</div>", "<p>Dne 3. 5. 2024 v 10:00 Jan Novák napsal/a:</p>", "<p>---------- Původní zpráva ----------</p>",
+          "On Mon, 1 Jan 2024 at 10:00, John <john@x.com> wrote:", "<p>____________________________________________</p>", ""]
+NOISE = ["Potvrzujeme, že Vaše zpráva byla úspěšně doručena.", "Jelikož Vám chceme poskytnout nejlepší servis, ...", "Dobrý den, dnes ve dnech 1.-5. čerpám dovolenou."]
+FUZZ_TOKENS = ["<", ">", "</p>", "<br>", "<br />", "</div>", "&nbsp;", "&amp;", "&lt;", "&gt;", "<style>", "</style>", "<script>", "</script>", "<b>", "\n", " ", "x",
+               "From:", "Dne ", " napsal/a:", "On ", " wrote:", "----------", "Původní zpráva", "_" * 44, "&amp;lt;", "<br&nbsp;/>", "S pozdravem", "Regards", "-----",
+               "FROM:", "ReGaRdS", "DĚKUJI\n", "ſ", "ı", "İ", "Potvrzujeme, že Vaše zpráva byla úspěšně doručena"]
+
+
+def make_email_corpus(n, seed=7):
+    # Realistické HTML e-maily (citace, podpisy, entity) + náhodný "fuzz" poškozeného HTML
+    rnd = random.Random(seed)
+    corpus = []
+    for i in range(n):
+        if i % 5 == 4:
+            corpus.append("".join(rnd.choice(FUZZ_TOKENS) for _ in range(rnd.randint(5, 60))))
+            continue
+        body = "".join(f"<p>{rnd.choice(FILLER)} &lt;obj. {rnd.randint(1, 9999)}&gt; &amp; spol.&nbsp;</p>" for _ in range(rnd.randint(1, 6)))
+        if rnd.random() < 0.1: body = f"<p>{rnd.choice(NOISE)}</p>" + body
+        thread = "".join(rnd.choice(QUOTES) + "<blockquote>" + rnd.choice(FILLER) * rnd.randint(1, 20) + "</blockquote>" for _ in range(rnd.randint(0, 4)))
+        html = (HTML_HEAD if rnd.random() < 0.5 else "") + body + "<div>" + rnd.choice(SIGNATURES) + "</div>" + thread + ("<script>track();</script></body></html>" if rnd.random() < 0.2 else "")
+        corpus.append(html)
+    return corpus
+
+
+def bench_cleaning(n_texts, repeat=3):
+    corpus = make_email_corpus(n_texts)
+    ref = [cut_reference(t) if t else t for t in (clean_html_reference(h) for h in corpus)]
+    new = [cut_noise_and_signature(t) if t else t for t in (clean_html(h) for h in corpus)]
+    mismatches = [i for i, (a, b) in enumerate(zip(ref, new)) if a != b]
+
+    def timed(fn):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for h in corpus:
+                t = fn[0](h)
+                if t: fn[1](t)
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    t_ref, t_new = timed((clean_html_reference, cut_reference)), timed((clean_html, cut_noise_and_signature))
+    mb = sum(len(h.encode('utf-8')) for h in corpus) / (1024 * 1024)
+    print(f"reference {n_texts / t_ref:10.0f} textů/s  {mb / t_ref:7.2f} MB/s")
+    print(f"engine    {n_texts / t_new:10.0f} textů/s  {mb / t_new:7.2f} MB/s  (zrychlení {t_ref / t_new:.2f}x)")
+    print(f"zlatý výstup: {len(ref) - len(mismatches)}/{len(ref)} shodných")
+    for i in mismatches[:5]: print(f"  ROZDÍL #{i}: {corpus[i][:120]!r}")
+    return not mismatches
+
+
+# --- URČENÍ STRANY (identify_side) ---
+def identify_side_reference(title, email, is_user=False):
+    # Původní lineární průchod CARRIERS_DATA - zlatý standard pro index v daktela_engine
+    if is_user:
+        return f"Balíkobot ({title})" if title and title.lower() != "balikobot" else "Balíkobot"
+    clean_title = title.lower() if title else ""
+    clean_email = email.lower() if email else ""
+    if "balikobot" in clean_email or "balikobot" in clean_title:
+        return f"Balíkobot ({title})" if title and title.lower() != "balikobot" else "Balíkobot"
+    for slug, name in CARRIERS_DATA.items():
+        if (slug and f"@{slug}." in clean_email) or (slug and clean_email.endswith(f"@{slug}.com")) or (name.lower() in clean_title):
+            return f"Dopravce ({name})"
+    return f"Klient ({title})" if title else "Klient"
+
+
+def make_contact_corpus(n, distinct=2000, seed=11):
+    # (titulek, e-mail) jako v aktivitách: opakující se odesílatelé, dopravci v doméně i v titulku,
+    # překrývající se názvy (DHL / DHL DE / DHL Parcel Europe), víc '@', velká písmena, prázdné hodnoty
+    rnd = random.Random(seed)
+    slugs, names = list(CARRIERS_DATA), list(CARRIERS_DATA.values())
+    def contact():
+        kind = rnd.random()
+        if kind < 0.25: return rnd.choice([None, "", "Jan Novák", "ESHOP s.r.o."]), f"{rnd.choice(FIRST_NAMES)}@{rnd.choice(DOMAINS)}"
+        if kind < 0.45: return rnd.choice([None, "Podpora", "Dispečink"]), f"info@{rnd.choice(slugs)}.{rnd.choice(['cz', 'com', 'sk', 'de'])}"
+        if kind < 0.65: return f"{rnd.choice(['', 'Reklamace ', 'RE: '])}{rnd.choice(names).upper() if rnd.random() < 0.3 else rnd.choice(names)} {rnd.choice(['', 'CZ', 'zákaznický servis'])}".strip(), rnd.choice(["", None, f"x@{rnd.choice(DOMAINS)}"])
+        if kind < 0.75: return rnd.choice(["Balikobot", "BALIKOBOT podpora", "Jan"]), rnd.choice(["podpora@balikobot.cz", "", None])
+        if kind < 0.85: return f"{rnd.choice(names)} + {rnd.choice(names)}", f"a@b@{rnd.choice(slugs)}.{rnd.choice(['cz', 'eu'])}"
+        return "".join(rnd.choice(["dhl", " ", "de", "@", ".", "ppl", "cp", "gls", "x"]) for _ in range(rnd.randint(0, 12))), "".join(rnd.choice(["@", ".", "dpd", "cp", "com", "@ups.", "x"]) for _ in range(rnd.randint(0, 8)))
+    pool = [contact() for _ in range(distinct)]
+    return [rnd.choice(pool) for _ in range(n)]
+
+
+def bench_sides(n_contacts):
+    corpus = make_contact_corpus(n_contacts)
+    distinct = sorted(set(corpus), key=repr)
+    mismatches = [(t, e) for t, e in distinct if identify_side(t, e) != identify_side_reference(t, e)]
+    mismatches += [(t, None) for t, _ in distinct if identify_side(t, None, is_user=True) != identify_side_reference(t, None, is_user=True)]
+
+    def timed(fn):
+        started = time.perf_counter()
+        for t, e in corpus: fn(t, e)
+        return time.perf_counter() - started
+
+    t_ref = timed(identify_side_reference)
+    t_index = timed(_identify_contact.__wrapped__)
+    _identify_contact.cache_clear()
+    t_cached = timed(identify_side)
+    print(f"reference {n_contacts / t_ref:12.0f} kontaktů/s")
+    print(f"index     {n_contacts / t_index:12.0f} kontaktů/s  (zrychlení {t_ref / t_index:.2f}x)")
+    print(f"index+LRU {n_contacts / t_cached:12.0f} kontaktů/s  (zrychlení {t_ref / t_cached:.2f}x, {_identify_contact.cache_info().hits} zásahů cache)")
+    print(f"shodné určení: {len(distinct) * 2 - len(mismatches)}/{len(distinct) * 2}")
+    for t, e in mismatches[:5]: print(f"  ROZDÍL: {t!r} {e!r}")
+    return not mismatches
+
+
+# --- END-TO-END (mock Daktela) ---
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss je na Linuxu v KB, na macOS v bajtech; RUSAGE_CHILDREN = největší z ukončených (a posbíraných) potomků
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def bench_e2e(args):
+    # Hledání + zpracování + export proti lokálnímu mock serveru (v samostatném procesu)
+    proc, url = start_mock_process(tickets=args.tickets, activities=args.activities, text_size=args.text_size, latency_ms=args.latency_ms,
+                                   jitter_ms=args.jitter_ms, error_rate=args.error_rate, retry_after=args.retry_after, capacity=args.capacity, seed=args.seed)
+    workers = args.workers or (DEFAULT_FETCH_WORKERS if args.fixed_workers else MAX_FETCH_WORKERS)
+    concurrency = None if args.fixed_workers else AdaptiveConcurrency(initial=min(DEFAULT_FETCH_WORKERS, workers), max_limit=workers)
+    rss_before = _peak_rss_mb()
+    rss_workers = None
+    metrics = RunMetrics()
+    anonymizer = AnonymizationPool() if args.anon == MODE_PRESIDIO else FastAnonymizer()
+    try:
+        with tempfile.TemporaryDirectory() as out, DaktelaClient(url, "bench", pool_size=max(workers, SEARCH_WORKERS), rate_limit=args.rate_limit or None, backoff_base=0.05, concurrency=concurrency) as client:
+            client.add_observer(metrics.observe_http)
+            cache = TicketCache(path=os.path.join(out, "cache.sqlite")) if args.cache else NullCache()
+            if isinstance(anonymizer, AnonymizationPool):
+                # Načtení modelu se do propustnosti nepočítá
+                for fut in anonymizer.warm_up(): fut.result()
+            started = time.perf_counter()
+            with metrics.timer("search_seconds"): tickets = client.search_tickets(build_search_params(START_DATE.date(), date.today()), page_size=SEARCH_PAGE_SIZE, workers=SEARCH_WORKERS)
+            writer = ExportWriter(directory=out, formats=[FORMAT_JSON] + args.format)
+            for entry in process_tickets(client, cache, anonymizer, tickets, workers, metrics=metrics, diff_mode=args.diff, activity_types=args.activity_types):
+                with metrics.timer("write_seconds"): writer.write(entry)
+            with metrics.timer("export_seconds"): export = writer.close()
+            elapsed = time.perf_counter() - started
+    finally:
+        if isinstance(anonymizer, AnonymizationPool):
+            # Workery Presidia mají vlastní RSS (model v každém) - po jejich ukončení, ještě před ukončením mocku
+            anonymizer.shutdown(wait=True)
+            rss_workers = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+        proc.terminate()
+
+    snapshot = metrics.snapshot()
+    http = snapshot["http"]
+    print(f"tickety   {export['tickets']:8d}  {export['tickets'] / elapsed:10.1f} ticketů/s")
+    print(f"aktivity  {export['activities']:8d}  {export['activities'] / elapsed:10.1f} aktivit/s")
+    print(f"čas {elapsed:.2f} s · export {export['size_bytes'] / (1024 * 1024):.1f} MB · peak RSS {_peak_rss_mb():.0f} MB (před během {rss_before:.0f} MB)"
+          + (f" · worker anonymizace {rss_workers:.0f} MB" if rss_workers is not None else ""))
+    print(f"memo: {snapshot['counters'].get('memo_hits', 0)} textů anonymizace ušetřeno" + (" · diff režim" if args.diff else ""))
+    print(f"HTTP: {sum(h['requests'] for h in http.values())} požadavků, {sum(h['retries'] for h in http.values())} opakování, {sum(h['errors'] for h in http.values())} chyb, {sum(h['bytes'] for h in http.values()) / (1024 * 1024):.1f} MB")
+    if concurrency:
+        control = concurrency.snapshot()
+        print(f"souběžnost: limit {control['limit']}/{control['max_limit']}, zásahy {control['counters']}")
+    print(f"{'fáze':40s} {'počet':>8s} {'celkem':>9s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'max':>8s}")
+    for row in summary_rows(snapshot): print(f"{row['fáze']:40s} {row['počet']:8d} {row['celkem']:9} {row['p50']:8} {row['p95']:8} {row['p99']:8} {row['max']:8}")
+    if args.report: write_report(args.report, snapshot, bench="e2e", args=vars(args), elapsed_s=elapsed, tickets=export["tickets"], activities=export["activities"], peak_rss_mb=_peak_rss_mb(), peak_rss_workers_mb=rss_workers)
+    if export["tickets"] != len(tickets):
+        print(f"CHYBA: zpracováno {export['tickets']} z {len(tickets)} ticketů")
+        return False
+    if args.min_tickets_per_s and export["tickets"] / elapsed < args.min_tickets_per_s:
+        print(f"REGRESE: {export['tickets'] / elapsed:.1f} ticketů/s < {args.min_tickets_per_s}")
+        return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarky Daktela harvesteru")
+    sub = parser.add_subparsers(dest="bench", required=True)
+    p_anon = sub.add_parser("anonymizer", help="propustnost a recall režimů anonymizace")
+    p_anon.add_argument("--texts", type=int, default=2000)
+    p_anon.add_argument("--batch-size", type=int, default=32)
+    p_clean = sub.add_parser("cleaning", help="rychlost čištění textu a shoda se zlatým výstupem")
+    p_clean.add_argument("--texts", type=int, default=5000)
+    p_sides = sub.add_parser("sides", help="rychlost identify_side a shoda s původním průchodem")
+    p_sides.add_argument("--contacts", type=int, default=200000)
+    p_e2e = sub.add_parser("e2e", help="hledání + zpracování + export proti lokálnímu mock serveru")
+    p_e2e.add_argument("--tickets", type=int, default=2000)
+    p_e2e.add_argument("--activities", type=float, default=5, help="průměr aktivit na ticket")
+    p_e2e.add_argument("--text-size", type=int, default=800, help="přibližná délka HTML aktivity")
+    p_e2e.add_argument("--latency-ms", type=float, default=20.0)
+    p_e2e.add_argument("--jitter-ms", type=float, default=10.0)
+    p_e2e.add_argument("--error-rate", type=float, default=0.0, help="podíl odpovědí 429/503")
+    p_e2e.add_argument("--workers", type=int, help=f"strop souběžnosti (výchozí {MAX_FETCH_WORKERS}, s --fixed-workers {DEFAULT_FETCH_WORKERS})")
+    p_e2e.add_argument("--fixed-workers", action="store_true", help="pevný počet stahování místo adaptivní souběžnosti")
+    p_e2e.add_argument("--capacity", type=int, default=0, help="kapacita mock serveru (souběžné požadavky, nad ní 429)")
+    p_e2e.add_argument("--retry-after", type=int, default=0, help="Retry-After u odpovědí 429 (s)")
+    p_e2e.add_argument("--rate-limit", type=float, default=0.0, help="max požadavků/s (0 = bez omezení)")
+    p_e2e.add_argument("--anon", choices=[MODE_FAST, MODE_PRESIDIO], default=MODE_FAST)
+    p_e2e.add_argument("--format", nargs="*", choices=[FORMAT_PARQUET, FORMAT_CSV], default=[], help="další formáty exportu")
+    p_e2e.add_argument("--cache", action="store_true", help="použít (prázdnou) SQLite cache aktivit")
+    p_e2e.add_argument("--diff", action="store_true", help="diff režim (jen nový text odpovědí)")
+    p_e2e.add_argument("--activity-types", nargs="+", choices=ACTIVITY_TYPES, help="stahovat jen vybrané typy aktivit")
+    p_e2e.add_argument("--seed", type=int, default=1)
+    p_e2e.add_argument("--report", help="zapsat JSON report")
+    p_e2e.add_argument("--min-tickets-per-s", type=float, default=0.0, help="selhat (exit 1) pod touto propustností")
+    args = parser.parse_args(argv)
+    if args.bench == "anonymizer" and not bench_anonymizer(args.texts, args.batch_size): sys.exit(1)
+    elif args.bench == "cleaning" and not bench_cleaning(args.texts): sys.exit(1)
+    elif args.bench == "sides" and not bench_sides(args.contacts): sys.exit(1)
+    elif args.bench == "e2e" and not bench_e2e(args): sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# --- LOKÁLNÍ CACHE TICKETŮ A AKTIVIT (SQLite) ---
+# Klíčem je 'name' ticketu. Aktivity jsou platné, dokud se nezmění 'edited' ticketu v Daktele.
+# Tickety samotné se necachují - 'edited' přichází vždy z čerstvého hledání.
+
+DEFAULT_CACHE_PATH = os.environ.get("DAKTELA_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "daktela_cache.sqlite"))
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_MAX_SIZE_MB = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS activities (ticket_name TEXT PRIMARY KEY, ticket_edited TEXT, payload TEXT NOT NULL, size INTEGER NOT NULL, synced_at REAL NOT NULL);
+"""
+
+
+class TicketCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age_days=DEFAULT_MAX_AGE_DAYS, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.path = path
+        self.max_age_days = max_age_days
+        self.max_size_mb = max_size_mb
+        self.lock = threading.Lock()
+        # Jedno spojení sdílené vlákny stahování, přístup serializuje self.lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+            self.conn.commit()
+
+    # --- AKTIVITY ---
+    def get_activities(self, name, edited):
+        # Bez 'edited' nelze poznat změnu -> vždy miss
+        if not edited: return None
+        with self.lock:
+            row = self.conn.execute("SELECT payload FROM activities WHERE ticket_name = ? AND ticket_edited = ?", (str(name), edited)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_activities(self, name, edited, acts):
+        payload = json.dumps(acts, ensure_ascii=False)
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO activities (ticket_name, ticket_edited, payload, size, synced_at) VALUES (?, ?, ?, ?, ?)",
+                              (str(name), edited, payload, len(payload.encode('utf-8')), time.time()))
+            self.conn.commit()
+
+    # --- SPRÁVA ---
+    def stats(self):
+        with self.lock:
+            acts, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM activities").fetchone()
+        return {"activity_sets": acts, "size_mb": size / (1024 * 1024)}
+
+    def evict(self):
+        # 1) starší než max_age_days, 2) nejstarší záznamy, dokud nejsme pod max_size_mb
+        removed = 0
+        with self.lock:
+            cutoff = time.time() - self.max_age_days * 86400
+            removed += self.conn.execute("DELETE FROM activities WHERE synced_at < ?", (cutoff,)).rowcount
+            limit = self.max_size_mb * 1024 * 1024
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM activities").fetchone()[0]
+            if total > limit:
+                for name, size in self.conn.execute("SELECT ticket_name, size FROM activities ORDER BY synced_at").fetchall():
+                    if total <= limit: break
+                    self.conn.execute("DELETE FROM activities WHERE ticket_name = ?", (name,))
+                    total -= size
+                    removed += 1
+            self.conn.commit()
+        return removed
+
+
+# --- SDÍLENÉ VÝSLEDKY HLEDÁNÍ (v paměti procesu) ---
+# Stejný filtr od více uživatelů = jedno hledání v API. LRU omezené odhadem velikosti + TTL,
+# aby výsledky nezastaraly. Vrácené seznamy sdílí všechny relace -> pouze pro čtení.
+class SearchResultCache:
+    def __init__(self, max_mb=256, ttl_seconds=600):
+        self.max_bytes = max_mb * 1024 * 1024
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # klíč -> (tickets, uloženo, velikost)
+        self.size = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(params):
+        return tuple(sorted((k, str(v)) for k, v in params.items()))
+
+    @staticmethod
+    def estimate_size(tickets):
+        # Kompaktní seznam (TicketList) zná svou velikost, jinak odhad podle JSON
+        if hasattr(tickets, "nbytes"): return tickets.nbytes()
+        return sum(len(json.dumps(t)) for t in tickets)
+
+    def get(self, key):
+        # (tickets, uloženo) nebo None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None: return None
+            if time.time() - entry[1] > self.ttl_seconds:
+                self._drop(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def put(self, key, tickets):
+        size = self.estimate_size(tickets)
+        with self.lock:
+            if key in self.entries: self._drop(key)
+            if size > self.max_bytes: return False
+            while self.entries and self.size + size > self.max_bytes: self._drop(next(iter(self.entries)))
+            self.entries[key] = (tickets, time.time(), size)
+            self.size += size
+            return True
+
+    def _drop(self, key):
+        self.size -= self.entries.pop(key)[2]
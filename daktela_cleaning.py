@@ -0,0 +1,86 @@
+import re
+
+# --- ČIŠTĚNÍ TEXTU AKTIVIT ---
+# Všechny regexy jsou předkompilované na úrovni modulu. Kombinované skenery (jedna alternace
+# místo smyčky přes vzory) rozhodují o rychlé cestě; kde by sloučení mohlo změnit výsledek
+# (poškozené HTML, překrývající se citace), dopočítá se přesně původní postup.
+# Výstup musí zůstat shodný s původní implementací - ověřuje `python daktela_bench.py cleaning`.
+
+def _lower_pattern(pattern):
+    # Převede literály vzoru na malá písmena, escape sekvence (\s, \n, \( ...) nechá být
+    return re.sub(r'(\\.)|([^\\]+)', lambda m: m.group(1) or m.group(2).lower(), pattern)
+
+def _casefolded(text):
+    # Hledání v text.lower() bez re.IGNORECASE je několikanásobně rychlejší. Pozice shod jsou
+    # použitelné jen při zachování délky a bez znaků, které IGNORECASE páruje jinak než lower().
+    low = text.lower()
+    if len(low) != len(text) or 'ı' in text or 'ſ' in text: return None
+    return low
+
+# Pořadí náhrad je součástí chování (např. "&amp;lt;" -> "&lt;", ne "<")
+BREAK_REPLACEMENTS = [('</p>', '\n'), ('<br>', '\n'), ('<br />', '\n'), ('</div>', '\n'), ('&nbsp;', ' ')]
+ENTITY_REPLACEMENTS = [('&lt;', '<'), ('&gt;', '>'), ('&amp;', '&')]
+BLOCK_RE = re.compile('<style.*?>.*?</style>|<script.*?>.*?</script>', re.DOTALL)
+TAG_RE = re.compile('<.*?>')
+BLANK_LINES_RE = re.compile(r'\n\s*\n')
+
+QUOTE_PATTERNS = [r'From:.*', r'Dne\s.*\snapsal/a:', r'----------\s*Původní zpráva\s*----------', r'On\s.*\swrote:', r'____________________________________________']
+QUOTE_RES = [re.compile(p, re.IGNORECASE) for p in QUOTE_PATTERNS]
+QUOTE_ANY_RE = re.compile("|".join(f"(?:{p})" for p in QUOTE_PATTERNS), re.IGNORECASE)
+QUOTE_LOWER_RES = [re.compile(_lower_pattern(p)) for p in QUOTE_PATTERNS]
+QUOTE_ANY_LOWER_RE = re.compile(_lower_pattern(QUOTE_ANY_RE.pattern))
+
+NOISE_PATTERNS = [r"Potvrzujeme, že Vaše zpráva byla úspěšně doručena", r"Jelikož Vám chceme poskytnout nejlepší servis", r"dnes ve dnech .* čerpám dovolenou"]
+NOISE_RE = re.compile("|".join(f"(?:{p})" for p in NOISE_PATTERNS), re.IGNORECASE)
+NOISE_LOWER_RE = re.compile(_lower_pattern(NOISE_RE.pattern))
+SIGNATURE_CUT_REGEX = re.compile(r"(S pozdravem|S pozdravom|Kind regards|Regards|S přáním pěkného dne|S přáním hezkého dne|Děkuji\n|Ďakujem\n|Díky\n|Tento e-mail nepředstavuje nabídku|Pro případ, že tato zpráva obsahuje návrh smlouvy|Disclaimer:|Confidentiality Notice:|Myslete na životní prostředí|Please think about the environment|-{5,}|_{5,}|---------- Odpovězená zpráva ----------|Dne .* odesílatel .* napsal\(a\):|Od: .* Posláno: .*|---------- Původní e-mail ----------)", re.IGNORECASE | re.MULTILINE)
+SIGNATURE_LOWER_RE = re.compile(_lower_pattern(SIGNATURE_CUT_REGEX.pattern), re.MULTILINE)
+
+AUTOMATIC_EMAIL = "[AUTOMATICKÝ EMAIL BALÍKOBOTU]"
+SIGNATURE_MARK = "\n\n[PODPIS]"
+
+
+def strip_html(text):
+    # Kroky se spouští jen tehdy, když text obsahuje něco, co mohou změnit
+    if '<' in text or '&' in text:
+        for old, new in BREAK_REPLACEMENTS:
+            if old in text: text = text.replace(old, new)
+    if '<' in text:
+        if '<style' in text or '<script' in text: text = BLOCK_RE.sub('', text)
+        text = TAG_RE.sub('', text)
+    if '&' in text:
+        for old, new in ENTITY_REPLACEMENTS:
+            if old in text: text = text.replace(old, new)
+    return text
+
+
+def cut_quotes(text):
+    # Jeden průchod kombinovaným regexem: bez shody není co řezat (každá shoda jednotlivého
+    # vzoru je i shodou alternace). Při shodě se řeže postupně jako dřív - vzor k hledá
+    # jen v už zkrácené části (endpos), takže se chová stejně jako re.split(...)[0].
+    low = _casefolded(text)
+    haystack, any_re, regexes = (text, QUOTE_ANY_RE, QUOTE_RES) if low is None else (low, QUOTE_ANY_LOWER_RE, QUOTE_LOWER_RES)
+    if not any_re.search(haystack): return text
+    end = len(text)
+    for regex in regexes:
+        m = regex.search(haystack, 0, end)
+        if m: end = m.start()
+    return text[:end]
+
+
+def clean_html(raw_html):
+    # HTML -> text, dekódování entit, useknutí citované historie, sloučení prázdných řádků.
+    # Anonymizace probíhá až v samostatné fázi (daktela_anonymizer).
+    if not raw_html: return ""
+    text = cut_quotes(strip_html(raw_html))
+    if '\n' in text: text = BLANK_LINES_RE.sub('\n\n', text)
+    return text.strip()
+
+
+def cut_noise_and_signature(text):
+    # Po anonymizaci: automatické zprávy nahradí značkou, jinak usekne podpis/patičku
+    low = _casefolded(text)
+    if (NOISE_RE.search(text) if low is None else NOISE_LOWER_RE.search(low)): return AUTOMATIC_EMAIL
+    match = SIGNATURE_CUT_REGEX.search(text) if low is None else SIGNATURE_LOWER_RE.search(low)
+    if match: return text[:match.start()].strip() + SIGNATURE_MARK
+    return text
@@ -0,0 +1,135 @@
+import argparse
+import logging
+import signal
+import sys
+import threading
+import time
+from datetime import date
+
+from daktela_anonymizer import AnonymizationPool, FastAnonymizer, MODE_FAST, MODE_PRESIDIO
+from daktela_cache import TicketCache
+from daktela_client import AdaptiveConcurrency, DaktelaClient, DaktelaApiError
+from daktela_engine import ACTIVITY_TYPES, DEFAULT_FETCH_WORKERS, MAX_FETCH_WORKERS, SEARCH_PAGE_SIZE, SEARCH_WORKERS, NullCache, build_search_params, evict_cache, load_credentials, process_tickets
+from daktela_export import ExportWriter, FORMAT_JSON, FORMAT_PARQUET, FORMAT_CSV, PARQUET_COMPRESSIONS, CSV_COMPRESSIONS
+from daktela_metrics import RunMetrics, summary_rows, to_openmetrics, write_report
+
+# --- HEADLESS TĚŽBA (bez Streamlitu, např. z cronu) ---
+# Spuštění: python daktela_cli.py harvest --from 2024-01-01 --to 2024-01-31 --format json parquet --output ./exporty
+# Přístupové údaje: DAKTELA_URL + DAKTELA_TOKEN, nebo --secrets cesta/secrets.toml (výchozí .streamlit/secrets.toml)
+# Metriky běhu: --report report.json (JSON), --openmetrics soubor.prom (např. pro node_exporter textfile collector)
+# Souběžnost se řídí odezvou API (AIMD, --workers = strop); --fixed-workers = pevný počet jako dřív
+# Návratový kód: 0 = hotovo, 1 = chyba API/konfigurace, 130 = přerušeno (během hledání bez exportu, během těžby export obsahuje hotové tickety)
+
+logger = logging.getLogger("daktela_cli")
+
+DEFAULT_RATE_LIMIT = 10.0
+ANON_PROCESSES = 2
+PROGRESS_EVERY = 100
+
+
+def _iso_date(value):
+    try: return date.fromisoformat(value)
+    except ValueError: raise argparse.ArgumentTypeError(f"neplatné datum '{value}' (očekává se RRRR-MM-DD)")
+
+
+def resolve_key(items, value, label):
+    # Kategorie/status lze zadat klíčem ('name') i názvem ('title', bez ohledu na velikost písmen)
+    if not value: return None
+    for item in items:
+        if value == item.get('name') or value.lower() == (item.get('title') or "").lower(): return item['name']
+    raise ValueError(f"Neznámá hodnota {label}: {value}")
+
+
+def harvest(args):
+    url, token = load_credentials(args.secrets)
+    formats = list(dict.fromkeys([FORMAT_JSON] + args.format))
+    workers = args.workers or (DEFAULT_FETCH_WORKERS if args.fixed_workers else MAX_FETCH_WORKERS)
+    concurrency = None if args.fixed_workers else AdaptiveConcurrency(initial=min(DEFAULT_FETCH_WORKERS, workers), max_limit=workers)
+    client = DaktelaClient(url, token, pool_size=max(workers, SEARCH_WORKERS), rate_limit=args.rate_limit or None, concurrency=concurrency)
+    cache = NullCache() if args.no_cache else TicketCache()
+    anonymizer = AnonymizationPool(processes=args.anon_processes) if args.anon == MODE_PRESIDIO else FastAnonymizer()
+    stop_event = threading.Event()
+    metrics = RunMetrics()
+    client.add_observer(metrics.observe_http)
+    try:
+        category = resolve_key(client.ticket_categories(), args.category, "kategorie") if args.category else None
+        status = resolve_key(client.statuses(), args.status, "statusu") if args.status else None
+        started = time.time()
+        with metrics.timer("search_seconds"): tickets = client.search_tickets(build_search_params(args.date_from, args.date_to, category, status), page_size=SEARCH_PAGE_SIZE, workers=SEARCH_WORKERS)
+        if args.limit: tickets = tickets[:args.limit]
+        logger.info("nalezeno %d ticketů za %.1f s", len(tickets), time.time() - started)
+        # SIGINT/SIGTERM: dokončí rozpracované tickety a uzavře export (cron timeout, Ctrl+C);
+        # až po hledání - to se přeruší hned a nic se nezapíše
+        for sig in (signal.SIGINT, signal.SIGTERM): signal.signal(sig, lambda *_: stop_event.set())
+
+        writer = ExportWriter(directory=args.output, prefix=args.prefix, formats=formats, parquet_compression=args.parquet_compression, csv_compression=args.csv_compression)
+        def on_fetched(idx, t_obj):
+            if (idx + 1) % PROGRESS_EVERY == 0 or idx + 1 == len(tickets):
+                logger.info("staženo %d/%d ticketů (%.1f ticketů/s)", idx + 1, len(tickets), (idx + 1) / max(time.time() - started, 1e-9))
+        try:
+            for entry in process_tickets(client, cache, anonymizer, tickets, workers, stop_event, args.force_refresh, on_fetched=on_fetched, metrics=metrics, diff_mode=args.diff, activity_types=args.activity_types):
+                with metrics.timer("write_seconds"): writer.write(entry)
+            with metrics.timer("export_seconds"): export = writer.close()
+        except BaseException:
+            # Chyba uprostřed běhu: rozepsané soubory se smažou (přerušení signálem export naopak řádně uzavře)
+            writer.discard()
+            raise
+        evict_cache(cache, metrics)
+    finally:
+        if isinstance(anonymizer, AnonymizationPool): anonymizer.shutdown()
+        client.close()
+    for key in ("json_path", "ids_path", "parquet_path", "csv_path"):
+        if export.get(key): print(export[key])
+    snapshot = metrics.snapshot()
+    control = concurrency.snapshot() if concurrency else None
+    if control: logger.info("souběžnost: limit %d/%d, zásahy %s", control["limit"], control["max_limit"], control["counters"])
+    for row in summary_rows(snapshot): logger.info("%-36s n=%-7d p50=%-8s p95=%-8s p99=%-8s max=%s", row["fáze"], row["počet"], row["p50"], row["p95"], row["p99"], row["max"])
+    if args.report: write_report(args.report, snapshot, args={k: str(v) for k, v in vars(args).items()}, export={k: v for k, v in export.items() if k != "preview"}, concurrency=control)
+    if args.openmetrics:
+        with open(args.openmetrics, "w", encoding="utf-8") as f: f.write(to_openmetrics(snapshot))
+    logger.info("hotovo: %d ticketů, %d aktivit, %.1f KB za %.1f s", export["tickets"], export["activities"], export["size_bytes"] / 1024, time.time() - started)
+    return 130 if stop_event.is_set() else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless těžba ticketů z Daktely")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("harvest", help="vyhledá tickety a zapíše export")
+    p.add_argument("--from", dest="date_from", type=_iso_date, required=True, help="datum vytvoření od (RRRR-MM-DD)")
+    p.add_argument("--to", dest="date_to", type=_iso_date, default=date.today(), help="datum vytvoření do (výchozí dnes)")
+    p.add_argument("--category", help="klíč nebo název kategorie (výchozí všechny)")
+    p.add_argument("--status", help="klíč nebo název statusu (výchozí všechny)")
+    p.add_argument("--workers", type=int, help=f"strop paralelního stahování aktivit (výchozí {MAX_FETCH_WORKERS}, s --fixed-workers {DEFAULT_FETCH_WORKERS})")
+    p.add_argument("--fixed-workers", action="store_true", help="pevný počet paralelních stahování (bez řízení podle odezvy API)")
+    p.add_argument("--rate-limit", type=float, default=DEFAULT_RATE_LIMIT, help="max požadavků/s na Daktelu (0 = bez omezení)")
+    p.add_argument("--limit", type=int, default=0, help="zpracovat jen prvních N ticketů (0 = všechny)")
+    p.add_argument("--format", nargs="+", choices=[FORMAT_JSON, FORMAT_PARQUET, FORMAT_CSV], default=[FORMAT_JSON], help="formáty exportu (JSON je vždy)")
+    p.add_argument("--parquet-compression", choices=PARQUET_COMPRESSIONS, default="zstd")
+    p.add_argument("--csv-compression", choices=list(CSV_COMPRESSIONS), default="gzip")
+    p.add_argument("--anon", choices=[MODE_FAST, MODE_PRESIDIO], default=MODE_FAST, help="režim anonymizace")
+    p.add_argument("--anon-processes", type=int, default=ANON_PROCESSES)
+    p.add_argument("--output", default=".", help="výstupní adresář")
+    p.add_argument("--prefix", default="daktela_", help="prefix názvů souborů")
+    p.add_argument("--activity-types", nargs="+", choices=ACTIVITY_TYPES, help="stahovat jen vybrané typy aktivit (výchozí všechny)")
+    p.add_argument("--diff", action="store_true", help="u odpovědí ukládat jen nový text (bez citované historie)")
+    p.add_argument("--force-refresh", action="store_true", help="ignorovat lokální cache aktivit")
+    p.add_argument("--no-cache", action="store_true", help="nepoužívat lokální SQLite cache")
+    p.add_argument("--secrets", help="TOML soubor s DAKTELA_URL a DAKTELA_TOKEN")
+    p.add_argument("--report", help="zapsat JSON report běhu (časy fází, HTTP po endpointech)")
+    p.add_argument("--openmetrics", help="zapsat metriky běhu ve formátu OpenMetrics")
+    args = parser.parse_args(argv)
+    if args.date_from > args.date_to: parser.error("--from je po --to")
+    if args.workers is not None and args.workers < 1: parser.error("--workers musí být alespoň 1")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    try: return harvest(args)
+    except (ValueError, DaktelaApiError) as e:
+        logger.error("%s", e)
+        return 1
+    except KeyboardInterrupt:
+        logger.error("přerušeno před zahájením těžby, export se nezapsal")
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,396 @@
+import contextvars
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- DAKTELA API KLIENT ---
+# Nezávislý na Streamlitu: jde použít z aplikace, ze skriptu i proti lokálnímu mock serveru.
+
+API_PREFIX = "/api/v6/"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Průběžné parsování (ijson) u velkých odpovědí: bez kopie celého těla v bytes i str
+DATA_ITEMS_PATH = "result.data.item"
+STREAM_MIN_BYTES = 64 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+# Adaptivní souběžnost (AIMD) a jistič - viz AdaptiveConcurrency
+OUTCOME_OK = "ok"
+OUTCOME_THROTTLED = "throttled"
+OUTCOME_ERROR = "error"
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+LATENCY_TOLERANCE = 1.5
+LATENCY_EWMA_ALPHA = 0.1
+BASELINE_DRIFT = 0.01
+MIN_DECREASE_INTERVAL = 0.1
+ERROR_WINDOW = 50
+ERROR_WINDOW_MIN = 30
+ERROR_RATE_THRESHOLD = 0.1
+MAX_PAUSE_SECONDS = 60.0
+BREAKER_FAILURES = 10
+BREAKER_COOLDOWN = 5.0
+BREAKER_MAX_COOLDOWN = 60.0
+BREAKER_MAX_TRIPS = 5
+CONCURRENCY_EVENTS_KEPT = 50
+
+
+class DaktelaApiError(Exception):
+    def __init__(self, message, status=None, endpoint=None):
+        super().__init__(message)
+        self.status = status
+        self.endpoint = endpoint
+
+
+class CircuitOpenError(DaktelaApiError):
+    # API dlouhodobě neodpovídá (jistič se opakovaně rozpojil) - běh má skončit, ne ukládat prázdné tickety
+    pass
+
+
+class RateLimiter:
+    # Jednoduchý token bucket sdílený všemi vlákny
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveConcurrency:
+    # Počet souběžných požadavků řízený odezvou API (AIMD), sdílený všemi vlákny klienta:
+    #   úspěch -> limit + 1/limit (zhruba +1 za každé "kolo" požadavků)
+    #   latence nad LATENCY_TOLERANCE x základní latence endpointu -> limit x 0.9
+    #   429 / 5xx / výpadek spojení -> limit x 0.5, když chyby tvoří přes ERROR_RATE_THRESHOLD posledních
+    #   ERROR_WINDOW odpovědí nebo server pošle Retry-After (ojedinělé náhodné chyby limit nesrazí, jen se zopakují)
+    #   snížení nejvýše jednou za "kolo" (vyhlazená latence) - souběžné chyby jednoho kola se nesčítají
+    #   Retry-After pozdrží všechna vlákna, ne jen to, které odpověď dostalo
+    # Jistič: BREAKER_FAILURES chyb po sobě -> pauza (roste 2x), pak jeden zkušební požadavek;
+    # po BREAKER_MAX_TRIPS rozpojeních bez jediného úspěchu acquire() během pauzy vyhodí CircuitOpenError
+    # (klient je sdílený - po pauze dostane další běh znovu zkušební požadavek).
+    def __init__(self, initial=8, min_limit=1, max_limit=32):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+        self.cond = threading.Condition()
+        self.paused_until = 0.0
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.latency = {}
+        self.baseline = {}
+        self.last_decrease = 0.0
+        self.outcomes = deque(maxlen=ERROR_WINDOW)  # True = chyba
+        self.counters = {"throttled": 0, "errors": 0, "decreases": 0, "pauses": 0, "breaker_trips": 0}
+        self.events = deque(maxlen=CONCURRENCY_EVENTS_KEPT)
+
+    def _event(self, kind, detail=""):
+        self.events.append({"time": time.time(), "event": kind, "limit": int(self.limit), "detail": detail})
+
+    def acquire(self):
+        with self.cond:
+            while True:
+                wait = self.paused_until - time.monotonic()
+                if wait > 0 and self.state == BREAKER_OPEN and self.trips >= BREAKER_MAX_TRIPS:
+                    raise CircuitOpenError(f"API neodpovídá ani po {BREAKER_MAX_TRIPS} pauzách jističe")
+                if wait <= 0:
+                    if self.state == BREAKER_OPEN:
+                        self.state = BREAKER_HALF_OPEN
+                        self._event("half_open", "zkušební požadavek")
+                    if self.in_flight < (1 if self.state == BREAKER_HALF_OPEN else int(self.limit)):
+                        self.in_flight += 1
+                        return
+                    wait = None
+                self.cond.wait(wait)
+
+    def release(self, latency, outcome, retry_after=None, key=""):
+        with self.cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            self.outcomes.append(outcome != OUTCOME_OK)
+            if outcome == OUTCOME_OK:
+                self.failures = 0
+                if self.state != BREAKER_CLOSED:
+                    self.state, self.trips = BREAKER_CLOSED, 0
+                    self._event("closed", "API opět odpovídá")
+                # Vyhlazená latence a základ (nejnižší vyhlazená, pomalu se přizpůsobuje denní zátěži) po endpointech
+                smooth = self.latency[key] = latency if key not in self.latency else self.latency[key] + LATENCY_EWMA_ALPHA * (latency - self.latency[key])
+                base = self.baseline[key] = smooth if key not in self.baseline else min(smooth, self.baseline[key] + BASELINE_DRIFT * (smooth - self.baseline[key]))
+                # Mění se jen, když limit opravdu omezuje - jinak (např. strop požadavků/s) by bez zátěže vyrostl
+                # na max_limit, nebo ho šum latence stáhl k minimu
+                if (self.in_flight + 1) * 2 < self.limit: pass
+                elif smooth > LATENCY_TOLERANCE * base:
+                    if now - self.last_decrease >= max(MIN_DECREASE_INTERVAL, smooth):
+                        self._decrease(0.9, now, f"latence {key} {smooth * 1000:.0f} ms (základ {base * 1000:.0f} ms)")
+                else: self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            else:
+                self.failures += 1
+                self.counters["throttled" if outcome == OUTCOME_THROTTLED else "errors"] += 1
+                if retry_after:
+                    self.paused_until = max(self.paused_until, now + min(retry_after, MAX_PAUSE_SECONDS))
+                    self.counters["pauses"] += 1
+                    self._event("pause", f"Retry-After {retry_after:.0f} s")
+                errors = sum(self.outcomes)
+                if ((retry_after or (len(self.outcomes) >= ERROR_WINDOW_MIN and errors > ERROR_RATE_THRESHOLD * len(self.outcomes)))
+                        and now - self.last_decrease >= max(MIN_DECREASE_INTERVAL, self.latency.get(key, 0.0))):
+                    self._decrease(0.5, now, f"{'HTTP 429' if outcome == OUTCOME_THROTTLED else 'chyba serveru/spojení'} ({errors}/{len(self.outcomes)} odpovědí)")
+                    # Další snížení až podle odpovědí po tomto
+                    self.outcomes.clear()
+                if self.state == BREAKER_HALF_OPEN or (self.state == BREAKER_CLOSED and self.failures >= BREAKER_FAILURES): self._trip(now)
+            self.cond.notify_all()
+
+    def _decrease(self, factor, now, reason):
+        self.limit = max(self.min_limit, self.limit * factor)
+        self.last_decrease = now
+        self.counters["decreases"] += 1
+        self._event("decrease", reason)
+
+    def _trip(self, now):
+        self.state = BREAKER_OPEN
+        self.trips += 1
+        self.counters["breaker_trips"] += 1
+        cooldown = min(BREAKER_MAX_COOLDOWN, BREAKER_COOLDOWN * 2 ** (self.trips - 1))
+        self.paused_until = max(self.paused_until, now + cooldown)
+        self._event("open", f"{self.failures} chyb po sobě, pauza {cooldown:.0f} s")
+
+    def snapshot(self):
+        # Pro UI (state.json jobu) a reporty
+        with self.cond:
+            return {"limit": int(self.limit), "max_limit": self.max_limit, "in_flight": self.in_flight, "state": self.state,
+                    "paused_s": max(0.0, self.paused_until - time.monotonic()),
+                    "latency_ms": {k: {"current": v * 1000, "baseline": self.baseline[k] * 1000} for k, v in self.latency.items()},
+                    "counters": dict(self.counters), "events": list(self.events)}
+
+
+def endpoint_key(endpoint):
+    # Sloučí per-ticket endpointy do jednoho klíče pro statistiky
+    return re.sub(r'^tickets/[^/]+/', 'tickets/{name}/', endpoint)
+
+
+# Pozorovatelé vázaní na kontext (add_observer(..., scoped=True)) - metriky jobu bez provozu ostatních jobů
+_SCOPED_OBSERVERS = contextvars.ContextVar("daktela_scoped_observers", default=())
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    # ThreadPoolExecutor kontext nepředává -> úloha běží v kopii kontextu volajícího (vč. scoped pozorovatelů)
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+_ijson = None
+
+def load_ijson():
+    # Volitelná závislost - bez ijson se odpověď parsuje celá přes res.json()
+    global _ijson
+    if _ijson is None:
+        try: import ijson
+        except ImportError: ijson = False
+        _ijson = ijson
+    return _ijson or None
+
+
+class _ChunkReader:
+    # Souborové rozhraní nad iter_content (dekomprese gzip, chyby spojení jako výjimky requests).
+    # Nikdy nevrací víc než n bajtů - C backend ijson čte do bufferu pevné velikosti.
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.buf = memoryview(b"")
+        self.size = 0
+
+    def read(self, n=-1):
+        if not self.buf:
+            for chunk in self.chunks:
+                if chunk:
+                    self.size += len(chunk)
+                    self.buf = memoryview(chunk)
+                    break
+            else: return b""
+        if n is None or n < 0: n = len(self.buf)
+        out, self.buf = self.buf[:n], self.buf[n:]
+        return bytes(out)
+
+
+def parse_retry_after(value):
+    if not value: return None
+    try: return max(0.0, float(value))
+    except ValueError: pass
+    try: return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError): return None
+
+
+class DaktelaClient:
+    def __init__(self, base_url, token, timeout=30, attempts=3, pool_size=32, rate_limit=None, backoff_base=0.5, backoff_max=30.0, concurrency=None):
+        # concurrency (AdaptiveConcurrency): souběžnost řízená odezvou API; rate_limit zůstává jako pevný strop
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.attempts = attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.concurrency = concurrency
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({'X-AUTH-TOKEN': token, 'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+        self._observers = []
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+    def close(self): self.session.close()
+
+    # --- STATISTIKY (počítají pozorovatelé, např. RunMetrics) ---
+    def _record(self, endpoint, latency, size=0, wire_size=0, error=False, retry=False):
+        key = endpoint_key(endpoint)
+        for observer in self._observers: observer(key, latency, size, wire_size, error, retry)
+        for observer in _SCOPED_OBSERVERS.get(): observer(key, latency, size, wire_size, error, retry)
+
+    def add_observer(self, observer, scoped=False):
+        # observer(endpoint_key, latency, size, wire_size, error, retry) - např. RunMetrics.observe_http
+        # Klient je sdílený: bez scoped vidí pozorovatel všechny požadavky, i souběžných jobů a relací;
+        # scoped=True jen požadavky z aktuálního kontextu (vlákno jobu + úlohy spuštěné přes submit_in_context)
+        if scoped: _SCOPED_OBSERVERS.set(_SCOPED_OBSERVERS.get() + (observer,))
+        else: self._observers = self._observers + [observer]
+
+    def remove_observer(self, observer):
+        self._observers = [o for o in self._observers if o != observer]
+        _SCOPED_OBSERVERS.set(tuple(o for o in _SCOPED_OBSERVERS.get() if o != observer))
+
+    # --- HTTP ---
+    def backoff_delay(self, attempt, retry_after=None):
+        # Exponenciální backoff s "full jitter"; Retry-After od serveru má přednost
+        if retry_after is not None: return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def get(self, endpoint, params=None, items_path=None):
+        # items_path (např. DATA_ITEMS_PATH): vrací rovnou seznam položek, velké odpovědi se parsují průběžně
+        url = f"{self.base_url}{API_PREFIX}{endpoint}"
+        last_error = None
+        for attempt in range(self.attempts):
+            if self.limiter: self.limiter.acquire()
+            if self.concurrency: self.concurrency.acquire()
+            started = time.perf_counter()
+            retry_after = None
+            outcome = OUTCOME_ERROR
+            try:
+                with self.session.get(url, params=params, timeout=self.timeout, stream=items_path is not None) as res:
+                    wire_size = int(res.headers.get('Content-Length') or 0)
+                    if res.status_code in RETRY_STATUSES:
+                        retry_after = parse_retry_after(res.headers.get('Retry-After'))
+                        if res.status_code == 429: outcome = OUTCOME_THROTTLED
+                        last_error = DaktelaApiError(f"HTTP {res.status_code} pro {endpoint}", res.status_code, endpoint)
+                        self._record(endpoint, time.perf_counter() - started, len(res.content), wire_size, error=True, retry=attempt + 1 < self.attempts)
+                    elif res.status_code >= 400:
+                        # 4xx (kromě 429) není přetížení API -> souběžnost nesnižuje
+                        outcome = OUTCOME_OK
+                        self._record(endpoint, time.perf_counter() - started, len(res.content), wire_size, error=True)
+                        raise DaktelaApiError(f"HTTP {res.status_code} pro {endpoint}", res.status_code, endpoint)
+                    else:
+                        payload, size = self._parse(res, items_path)
+                        self._record(endpoint, time.perf_counter() - started, size, wire_size)
+                        outcome = OUTCOME_OK
+                        return payload
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError, ValueError) as e:
+                # ValueError = nečitelný JSON (např. useknutá odpověď)
+                self._record(endpoint, time.perf_counter() - started, error=True, retry=attempt + 1 < self.attempts)
+                last_error = DaktelaApiError(f"{type(e).__name__} pro {endpoint}: {e}", None, endpoint)
+            finally:
+                if self.concurrency: self.concurrency.release(time.perf_counter() - started, outcome, retry_after, endpoint_key(endpoint))
+            if attempt + 1 < self.attempts: time.sleep(self.backoff_delay(attempt, retry_after))
+        raise last_error
+
+    @staticmethod
+    def _parse(res, items_path):
+        # (payload, velikost po dekompresi); latence pak zahrnuje i stažení těla
+        ijson = load_ijson() if items_path else None
+        wire_size = int(res.headers.get('Content-Length') or 0)
+        if ijson is None or (wire_size and wire_size < STREAM_MIN_BYTES):
+            payload = res.json()
+            if items_path:
+                for key in items_path.split(".")[:-1]: payload = (payload or {}).get(key) if isinstance(payload, dict) else None
+                payload = payload or []
+            return payload, len(res.content)
+        reader = _ChunkReader(res.iter_content(STREAM_CHUNK_SIZE))
+        try: items = list(ijson.items(reader, items_path, use_float=True))
+        except ijson.JSONError as e: raise ValueError(f"nečitelný JSON: {e}") from e
+        return items, reader.size
+
+    def get_result(self, endpoint, params=None):
+        return (self.get(endpoint, params) or {}).get('result', {}) or {}
+
+    def get_data(self, endpoint, params=None):
+        return self.get_result(endpoint, params).get('data', []) or []
+
+    # --- ENDPOINTY ---
+    def ticket_categories(self):
+        return self.get_data("ticketsCategories.json")
+
+    def statuses(self):
+        return self.get_data("statuses.json")
+
+    def ticket_activities(self, t_num, params=None):
+        # params: projekce fields[] a filtry (viz build_activity_params v daktela_engine)
+        return self.get(f"tickets/{t_num}/activities.json", params, items_path=DATA_ITEMS_PATH)
+
+    def search_tickets(self, params, page_size=1000, workers=4, on_progress=None):
+        # První stránka vrátí i 'total' -> zbylé offsety (skip) se stahují paralelně.
+        # on_progress(staženo, celkem) se volá z vlákna volajícího, lze v něm tedy kreslit UI.
+        first = self.get_result("tickets.json", dict(params, take=page_size, skip=0))
+        data = first.get('data') or []
+        total = first.get('total')
+        if on_progress: on_progress(len(data), total)
+        if len(data) < page_size: return data
+        try: total = int(total)
+        except (TypeError, ValueError): return data + self._search_sequential(params, page_size, page_size, len(data), on_progress)
+
+        pages = {0: data}
+        fetched = len(data)
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="daktela-search") as executor:
+            futures = {submit_in_context(executor, self.get_data, "tickets.json", dict(params, take=page_size, skip=skip)): skip for skip in range(page_size, total, page_size)}
+            for fut in as_completed(futures):
+                pages[futures[fut]] = fut.result()
+                fetched += len(pages[futures[fut]])
+                if on_progress: on_progress(fetched, total)
+        # Poslední stránka plná -> mezitím mohly přibýt tickety, dočteme zbytek sekvenčně
+        last_skip = max(pages)
+        if len(pages[last_skip]) == page_size:
+            pages[last_skip + page_size] = self._search_sequential(params, page_size, last_skip + page_size, fetched, on_progress)
+
+        # Mezi požadavky se data mohou posunout -> deduplikace podle 'name'
+        seen, all_tickets = set(), []
+        for skip in sorted(pages):
+            for t in pages[skip]:
+                if t.get('name') in seen: continue
+                seen.add(t.get('name'))
+                all_tickets.append(t)
+        return all_tickets
+
+    def _search_sequential(self, params, page_size, skip, fetched, on_progress=None):
+        result = []
+        page_params = dict(params, take=page_size, skip=skip)
+        while True:
+            data = self.get_data("tickets.json", page_params)
+            if not data: break
+            result.extend(data)
+            if on_progress: on_progress(fetched + len(result), None)
+            if len(data) < page_size: break
+            page_params["skip"] += page_size
+        return result
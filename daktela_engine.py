@@ -0,0 +1,323 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import tomllib
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from datetime import datetime
+
+from daktela_cleaning import BLANK_LINES_RE, NOISE_RE, clean_html, cut_noise_and_signature
+from daktela_client import CircuitOpenError, DaktelaApiError, submit_in_context
+from daktela_metrics import RunMetrics
+from daktela_records import VIP_MARK
+
+# --- HARVEST ENGINE ---
+# Zpracování ticketů bez závislosti na Streamlitu: stahování aktivit, čištění, anonymizace,
+# sestavení záznamů pro export. Používá ho aplikace (přes background job) i CLI (daktela_cli.py).
+
+# Souběžnost stahování: výchozí (pevný režim, start adaptivního) a strop adaptivního řízení
+DEFAULT_FETCH_WORKERS = 8
+MAX_FETCH_WORKERS = 32
+ANON_QUEUE_DEPTH = 16
+# Memo anonymizace (hash vyčištěného textu -> výstup) a diff režim (jen nový text odpovědi)
+MEMO_MAX_ENTRIES = 50000
+DIFF_MIN_LINE = 20
+DIFF_EMPTY_MARK = "[BEZ NOVÉHO TEXTU]"
+SEARCH_PAGE_SIZE = 1000
+SEARCH_WORKERS = 4
+SEARCH_FIELDS = ["name", "title", "created", "customFields", "category", "statuses", "edited"]
+# Projekce aktivit = jen pole, která čte prepare_ticket (bez ticketu, fronty, záznamů, ...)
+ACTIVITY_FIELDS = ["time", "type", "description", "item", "user", "contact"]
+ACTIVITY_TYPES = ["EMAIL", "COMMENT", "CALL", "CHAT", "SMS", "FBM", "IGDM", "WAP", "VBR", "CUSTOM"]
+# Přístupové údaje mimo Streamlit: proměnné prostředí, jinak TOML soubor ve formátu secrets.toml
+DEFAULT_SECRETS_PATH = os.environ.get("DAKTELA_SECRETS", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml"))
+
+CARRIERS_DATA = {
+    "cp": "Česká pošta", "ppl": "PPL", "dpd": "DPD", "geis": "Geis", "gls": "GLS",
+    "zasilkovna": "Zásilkovna", "intime": "We Do", "toptrans": "Top Trans", "pbh": "Pošta Bez Hranic",
+    "dhl": "DHL", "sp": "Slovenská pošta", "ups": "UPS", "tnt": "TNT", "sps": "SK Parcel Service",
+    "gw": "Gebrüder Weiss SK", "gwcz": "Gebrüder Weiss CZ", "dhlde": "DHL DE", "messenger": "Messenger",
+    "fofr": "Fofr", "fedex": "Fedex", "dachser": "Dachser", "raben": "Raben", "dhlfreightec": "DHL Freight Euroconnect",
+    "dhlparcel": "DHL Parcel Europe", "liftago": "Kurýr na přesný čas", "dbschenker": "DB Schenker",
+    "dsv": "DSV", "spring": "Spring", "kurier": "123 Kuriér", "airway": "Airway", "japo": "JAPO Transport",
+    "magyarposta": "Magyar Posta", "sameday": "Sameday", "sds": "SLOVENSKÝ DORUČOVACÍ SYSTÉM",
+    "inpost": "InPost", "onebyallegro": "One by Allegro"
+}
+# Index pro identify_side: pořadí v CARRIERS_DATA = priorita (vyhrává první dopravce, jako u lineárního průchodu)
+CARRIER_NAMES = list(CARRIERS_DATA.values())
+CARRIER_BY_SLUG = {slug: i for i, slug in enumerate(CARRIERS_DATA)}
+CARRIER_BY_TITLE = {name.lower(): i for i, name in enumerate(CARRIER_NAMES)}
+# "@slug." kdekoli v e-mailu = část za '@' až po první tečku
+EMAIL_SLUG_RE = re.compile(r'@([^.@]*)\.')
+# Lookahead najde na každé pozici první (nejprioritnější) název -> minimum přes pozice = výsledek průchodu
+CARRIER_TITLE_RE = re.compile("(?=(" + "|".join(re.escape(name.lower()) for name in CARRIER_NAMES) + "))")
+SIDE_CACHE_SIZE = 8192
+
+# --- KONFIGURACE A HLEDÁNÍ ---
+def load_credentials(path=None):
+    # (url, token) z DAKTELA_URL/DAKTELA_TOKEN, jinak ze souboru se stejnými klíči jako st.secrets
+    url, token = os.environ.get("DAKTELA_URL"), os.environ.get("DAKTELA_TOKEN")
+    if not (url and token):
+        path = path or DEFAULT_SECRETS_PATH
+        try:
+            with open(path, "rb") as f: secrets = tomllib.load(f)
+        except (OSError, tomllib.TOMLDecodeError) as e: raise ValueError(f"Nelze načíst přístupové údaje z {path}: {e}") from e
+        url, token = url or secrets.get("DAKTELA_URL"), token or secrets.get("DAKTELA_TOKEN")
+    if not (url and token): raise ValueError("Chybí DAKTELA_URL nebo DAKTELA_TOKEN")
+    return url, token
+
+def build_search_params(date_from, date_to, category=None, status=None):
+    # Parametry hledání ticketů: období vytvoření (včetně obou dnů) + volitelně kategorie a status (klíč 'name')
+    params = {"filter[logic]": "and",
+              "filter[filters][0][field]": "created", "filter[filters][0][operator]": "gte", "filter[filters][0][value]": f"{date_from} 00:00:00",
+              "filter[filters][1][field]": "created", "filter[filters][1][operator]": "lte", "filter[filters][1][value]": f"{date_to} 23:59:59"}
+    params.update({f"fields[{i}]": field for i, field in enumerate(SEARCH_FIELDS)})
+    filter_idx = 2
+    for field, value in (("category", category), ("statuses", status)):
+        if value and value != "ALL":
+            params.update({f"filter[filters][{filter_idx}][field]": field, f"filter[filters][{filter_idx}][operator]": "eq", f"filter[filters][{filter_idx}][value]": value})
+            filter_idx += 1
+    return params
+
+def build_activity_params(activity_types=None):
+    # Parametry stahování aktivit: projekce fields[] + volitelně jen vybrané typy (None = všechny)
+    params = {f"fields[{i}]": field for i, field in enumerate(ACTIVITY_FIELDS)}
+    if activity_types:
+        params["filter[logic]"] = "or"
+        for i, act_type in enumerate(activity_types):
+            params.update({f"filter[filters][{i}][field]": "type", f"filter[filters][{i}][operator]": "eq", f"filter[filters][{i}][value]": act_type})
+    return params
+
+class NullCache:
+    # Náhrada TicketCache bez ukládání (CLI --no-cache, benchmarky) - vše jde z API
+    def get_activities(self, ticket_name, edited): return None
+    def put_activities(self, ticket_name, edited, activities): pass
+    def evict(self): pass
+
+# --- STAHOVÁNÍ AKTIVIT ---
+def fetch_activities(client, cache, t_obj, force_refresh=False, metrics=None, activity_types=None):
+    # Běží ve vlákně; po vyčerpání pokusů klienta vrací prázdný seznam,
+    # rozpojený jistič (API dlouhodobě nedostupné) ukončí celý běh - tickety se neuloží prázdné
+    # Nezměněný ticket (stejné 'edited') se obslouží z lokální cache bez dotazu na API
+    # Filtr typů jde na server; cache drží jen úplné seznamy (z ní se filtruje lokálně)
+    # Chyba lokální cache (plný disk, poškozený záznam) běh nezastaví: čtení jde na API, zápis se vynechá
+    t_num, edited = t_obj.get('name'), t_obj.get('edited')
+    if not force_refresh:
+        try: acts = cache.get_activities(t_num, edited)
+        except (sqlite3.Error, ValueError):
+            if metrics: metrics.count("cache_errors")
+            acts = None
+        if acts is not None:
+            if metrics: metrics.count("cache_hits")
+            return [a for a in acts if (a.get('type') or "COMMENT") in activity_types] if activity_types else acts
+    started = time.perf_counter()
+    try: acts = client.ticket_activities(t_num, build_activity_params(activity_types))
+    except CircuitOpenError: raise
+    except DaktelaApiError:
+        if metrics: metrics.count("fetch_errors")
+        return []
+    if metrics: metrics.observe("fetch_seconds", time.perf_counter() - started)
+    if not activity_types:
+        try: cache.put_activities(t_num, edited, acts)
+        except sqlite3.Error:
+            if metrics: metrics.count("cache_errors")
+    return acts
+
+def evict_cache(cache, metrics=None):
+    # Úklid cache po běhu; chyba (DB sdílená s CLI -> "database is locked") hotovou těžbu neshodí
+    try: cache.evict()
+    except sqlite3.Error:
+        if metrics: metrics.count("cache_errors")
+
+def iter_fetched_activities(client, cache, tickets, workers, stop_event, force_refresh=False, metrics=None, activity_types=None):
+    # Stahuje aktivity paralelně, ale výsledky vrací ve stejném pořadí jako tickety.
+    # V letu je nejvýše 2*workers požadavků, aby šlo proces rychle zastavit.
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="daktela-fetch")
+    pending = []
+    try:
+        it = iter(tickets)
+        for t_obj in it:
+            pending.append((t_obj, submit_in_context(executor, fetch_activities, client, cache, t_obj, force_refresh, metrics, activity_types)))
+            if len(pending) >= workers * 2: break
+        while pending and not stop_event.is_set():
+            t_obj, fut = pending.pop(0)
+            acts = fut.result()
+            nxt = next(it, None)
+            if nxt is not None: pending.append((nxt, submit_in_context(executor, fetch_activities, client, cache, nxt, force_refresh, metrics, activity_types)))
+            yield t_obj, acts
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def format_date_split(date_str):
+    if not date_str: return "N/A", "N/A"
+    try:
+        dt = datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
+        return dt.strftime('%d.%m.%Y'), dt.strftime('%H:%M:%S')
+    except: return date_str, "N/A"
+
+def identify_side(title, email, is_user=False):
+    if is_user:
+        return f"Balíkobot ({title})" if title and title.lower() != "balikobot" else "Balíkobot"
+    return _identify_contact(title, email)
+
+@lru_cache(maxsize=SIDE_CACHE_SIZE)
+def _identify_contact(title, email):
+    # Stejní odesílatelé se opakují -> LRU; jinak hash lookup domény + jeden průchod titulkem
+    clean_title = title.lower() if title else ""
+    clean_email = email.lower() if email else ""
+    if "balikobot" in clean_email or "balikobot" in clean_title:
+        return f"Balíkobot ({title})" if title and title.lower() != "balikobot" else "Balíkobot"
+    hits = [CARRIER_BY_SLUG[s] for s in EMAIL_SLUG_RE.findall(clean_email) if s in CARRIER_BY_SLUG]
+    if clean_title: hits.extend(CARRIER_BY_TITLE[name] for name in CARRIER_TITLE_RE.findall(clean_title))
+    if hits: return f"Dopravce ({CARRIER_NAMES[min(hits)]})"
+    return f"Klient ({title})" if title else "Klient"
+
+# --- MEMO A DIFF ---
+def text_key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+class TextMemo:
+    # LRU hash -> anonymizovaný text, napříč aktivitami i tickety jednoho běhu.
+    # inflight = klíče odeslané k anonymizaci, jejichž výsledek ještě nedorazil (stejný text se neposílá dvakrát).
+    # Používá ho jen vlákno process_tickets -> bez zámku.
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.inflight = set()
+
+    def __contains__(self, key): return key in self.entries
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None: self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries: self.entries.popitem(last=False)
+
+def diff_new_text(text, seen_lines):
+    # Diff režim: z odpovědi zůstanou jen řádky, které v ticketu ještě nezazněly (citace bez rozpoznané hlavičky,
+    # "> " odsazení). Krátké řádky (pozdrav, podpis) zůstávají, aby text dával smysl.
+    kept, new_lines = [], set()
+    for line in text.split('\n'):
+        norm = line.lstrip('> \t').strip()
+        if len(norm) >= DIFF_MIN_LINE:
+            if norm in seen_lines: continue
+            new_lines.add(norm)
+        kept.append(line)
+    seen_lines.update(new_lines)
+    return BLANK_LINES_RE.sub('\n\n', '\n'.join(kept)).strip() or DIFF_EMPTY_MARK
+
+# --- ZPRACOVÁNÍ TICKETU ---
+def prepare_ticket(t_obj, acts, diff_mode=False):
+    # 1. část: metadata ticketu a aktivit + vyčištěné texty k anonymizaci (ve stejném pořadí)
+    t_num = t_obj.get('name')
+    t_date, t_time = format_date_split(t_obj.get('created'))
+    t_status = t_obj.get('statuses', [{}])[0].get('title', 'N/A') if isinstance(t_obj.get('statuses'), list) and t_obj.get('statuses') else "N/A"
+    custom_fields = t_obj.get('customFields', {})
+    vip_list = custom_fields.get('vip', [])
+    ticket_clientType = "VIP" if VIP_MARK in vip_list else "Standard"
+    
+    ticket_entry = {"ticket_number": t_num, "ticket_name": t_obj.get('title', 'Bez předmětu'), "ticket_clientType": ticket_clientType, "ticket_category": t_obj.get('category', {}).get('title', 'N/A') if t_obj.get('category') else "N/A", "ticket_status": t_status, "ticket_creationDate": t_date, "ticket_creationTime": t_time, "activities": []}
+    act_datas, texts = [], []
+    seen_lines = set()
+
+    for a_idx, act in enumerate(sorted(acts, key=lambda x: x.get('time', '')), 1):
+        item = act.get('item') or {}
+        address = item.get('address', '')
+        cleaned = clean_html(item.get('text') or act.get('description'))
+        if not cleaned: continue
+        # Automatická zpráva se nediffuje: opakovaná by jinak skončila jako prázdná místo značky automatického emailu
+        if diff_mode and not NOISE_RE.search(cleaned): cleaned = diff_new_text(cleaned, seen_lines)
+        u_title = (act.get('user') or {}).get('title')
+        c_title = (act.get('contact') or {}).get('title')
+        direction = item.get('direction', 'out')
+        if direction == "in": sender = identify_side(c_title, address, is_user=False); recipient = "Balíkobot"
+        else: sender = identify_side(u_title, "", is_user=True); recipient = identify_side(c_title, address, is_user=False)
+        a_date, a_time = format_date_split(act.get('time'))
+        act_type = act.get('type') or "COMMENT"
+        act_data = {"activity_number": a_idx, "activity_type": act_type, "activity_sender": sender}
+        if act_type != "COMMENT": act_data["activity_recipient"] = recipient
+        act_data.update({"activity_creationDate": a_date, "activity_creationTime": a_time})
+        act_datas.append(act_data)
+        texts.append(cleaned)
+    return ticket_entry, act_datas, texts
+
+def finalize_ticket(ticket_entry, act_datas, anonymized):
+    # 2. část: po anonymizaci odstranění automatických zpráv a podpisů
+    for act_data, cleaned in zip(act_datas, anonymized):
+        act_data["activity_text"] = cut_noise_and_signature(cleaned)
+        ticket_entry["activities"].append(act_data)
+    return ticket_entry
+
+def _submit_missing(anonymizer, memo, texts, metrics):
+    # K anonymizaci jdou jen texty, které nejsou v memu ani už na cestě; vrací (klíče, odeslané klíče, future)
+    keys = [text_key(t) for t in texts]
+    missing, missing_texts = [], []
+    for key, text in zip(keys, texts):
+        if key in memo or key in memo.inflight: continue
+        memo.inflight.add(key)
+        missing.append(key)
+        missing_texts.append(text)
+    metrics.count("memo_hits", len(keys) - len(missing))
+    if missing_texts: return keys, missing, anonymizer.submit(missing_texts)
+    fut = Future()
+    fut.set_result([])
+    return keys, missing, fut
+
+def _finish_ticket(ticket_entry, act_datas, texts, keys, missing, fut, anonymizer, memo, metrics):
+    # Vyzvednutí anonymizace + dokončení ticketu; None = ticket se přeskočí
+    try:
+        if not fut.done():
+            with metrics.timer("anonymize_wait_seconds"): fut.result()
+        for key, out in zip(missing, fut.result()): memo.put(key, out)
+        if getattr(fut, "seconds", None) is not None: metrics.observe("anonymize_seconds", fut.seconds)
+        anonymized = [memo.get(key) for key in keys]
+        # Výsledek cizí dávky chybí (ticket selhal, vypadl z LRU) -> dopočítat
+        lost = [i for i, out in enumerate(anonymized) if out is None]
+        if lost:
+            for i, out in zip(lost, anonymizer.submit([texts[i] for i in lost]).result()): anonymized[i] = out
+        with metrics.timer("signature_seconds"): entry = finalize_ticket(ticket_entry, act_datas, anonymized)
+    except Exception: return None
+    finally: memo.inflight.difference_update(missing)
+    metrics.count("tickets")
+    metrics.count("activities", len(entry["activities"]))
+    metrics.observe("activities_per_ticket", len(entry["activities"]))
+    return entry
+
+def process_tickets(client, cache, anonymizer, tickets, workers=DEFAULT_FETCH_WORKERS, stop_event=None, force_refresh=False, queue_depth=ANON_QUEUE_DEPTH, on_fetched=None, metrics=None, diff_mode=False, memo=None, activity_types=None):
+    # Generátor hotových ticket_entry ve stejném pořadí jako 'tickets'.
+    # anonymizer = cokoli se submit(texts) -> Future (AnonymizationPool, FastAnonymizer);
+    # anonymizace ticketu běží na pozadí, mezitím se stahují a čistí další tickety.
+    # on_fetched(idx, t_obj) se volá po stažení každého ticketu (průběh, ETA).
+    # metrics (RunMetrics) sbírá časy fází: fetch, clean, anonymize(_wait), signature.
+    # Stejný vyčištěný text se anonymizuje jen jednou (memo); diff_mode = u odpovědí jen nový text.
+    # activity_types = stahovat jen vybrané typy aktivit (filtr na serveru), None = všechny.
+    # Ticket, jehož zpracování selže, se přeskočí (stejně jako dřív).
+    stop_event = stop_event or threading.Event()
+    metrics = metrics or RunMetrics()
+    memo = TextMemo() if memo is None else memo
+    anon_queue = deque()
+    fetched = iter_fetched_activities(client, cache, tickets, workers, stop_event, force_refresh, metrics, activity_types)
+    try:
+        for idx, (t_obj, acts) in enumerate(fetched):
+            if on_fetched: on_fetched(idx, t_obj)
+            try:
+                with metrics.timer("clean_seconds"): ticket_entry, act_datas, texts = prepare_ticket(t_obj, acts, diff_mode)
+                anon_queue.append((ticket_entry, act_datas, texts, *_submit_missing(anonymizer, memo, texts, metrics)))
+            except Exception: pass
+            while anon_queue and (anon_queue[0][-1].done() or len(anon_queue) > queue_depth):
+                entry = _finish_ticket(*anon_queue.popleft(), anonymizer, memo, metrics)
+                if entry is not None: yield entry
+    finally:
+        # Zruší nezahájené požadavky (i při přerušení zvenku)
+        fetched.close()
+    while anon_queue and not stop_event.is_set():
+        entry = _finish_ticket(*anon_queue.popleft(), anonymizer, memo, metrics)
+        if entry is not None: yield entry
@@ -0,0 +1,187 @@
+import bz2
+import csv
+import gzip
+import json
+import lzma
+import os
+import stat
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+
+# --- PRŮBĚŽNÝ EXPORT ---
+# Tickety se zapisují na disk hned po dokončení, v paměti (session_state) zůstává jen malý "handle"
+# se statistikami a cestami k souborům. Formát JSON je shodný s json.dumps(seznam, indent=2).
+# Volitelně se ze stejných záznamů (ticket_entry / act_data) plní i sloupcové formáty:
+# Parquet (tabulky tickets + activities propojené přes ticket_number) a komprimované CSV.
+
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "daktela_exports")
+STALE_EXPORT_HOURS = 24
+
+FORMAT_JSON = "json"
+FORMAT_PARQUET = "parquet"
+FORMAT_CSV = "csv"
+PARQUET_COMPRESSIONS = ["zstd", "snappy", "gzip", "none"]
+CSV_COMPRESSIONS = {"gzip": (gzip.open, ".csv.gz"), "bz2": (bz2.open, ".csv.bz2"), "xz": (lzma.open, ".csv.xz"), "none": (open, ".csv")}
+COLUMNAR_BATCH_SIZE = 5000
+
+TICKET_COLUMNS = ["ticket_number", "ticket_name", "ticket_clientType", "ticket_category", "ticket_status", "ticket_creationDate", "ticket_creationTime", "activity_count"]
+ACTIVITY_COLUMNS = ["ticket_number", "activity_number", "activity_type", "activity_sender", "activity_recipient", "activity_creationDate", "activity_creationTime", "activity_text"]
+
+
+def flatten_ticket(ticket_entry):
+    # ticket_entry -> (řádek tabulky tickets, řádky tabulky activities); ticket_number jako text kvůli spojení
+    t_num = str(ticket_entry['ticket_number'])
+    ticket_row = {c: ticket_entry.get(c) for c in TICKET_COLUMNS[1:-1]}
+    ticket_row.update(ticket_number=t_num, activity_count=len(ticket_entry['activities']))
+    activity_rows = [dict({c: a.get(c) for c in ACTIVITY_COLUMNS[1:]}, ticket_number=t_num) for a in ticket_entry['activities']]
+    return ticket_row, activity_rows
+
+
+class ParquetSink:
+    # Dva Parquet soubory zapisované po dávkách (row groups), na konci zabalené do jednoho ZIPu
+    def __init__(self, base_path, compression="zstd", batch_size=COLUMNAR_BATCH_SIZE):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.batch_size = batch_size
+        self.zip_path = base_path + "_parquet.zip"
+        self.paths = {"tickets": base_path + "_tickets.parquet", "activities": base_path + "_activities.parquet"}
+        self.schemas = {
+            "tickets": pa.schema([(c, pa.int32() if c == "activity_count" else pa.string()) for c in TICKET_COLUMNS]),
+            "activities": pa.schema([(c, pa.int32() if c == "activity_number" else pa.string()) for c in ACTIVITY_COLUMNS]),
+        }
+        compression = None if compression == "none" else compression
+        self.writers = {name: pq.ParquetWriter(path, self.schemas[name], compression=compression) for name, path in self.paths.items()}
+        self.buffers = {"tickets": [], "activities": []}
+
+    def write(self, ticket_row, activity_rows):
+        self.buffers["tickets"].append(ticket_row)
+        self.buffers["activities"].extend(activity_rows)
+        for name, rows in self.buffers.items():
+            if len(rows) >= self.batch_size: self._flush(name)
+
+    def _flush(self, name):
+        if not self.buffers[name]: return
+        self.writers[name].write_table(self.pa.Table.from_pylist(self.buffers[name], schema=self.schemas[name]))
+        self.buffers[name] = []
+
+    def close(self):
+        for name in self.writers:
+            self._flush(name)
+            self.writers[name].close()
+        # Parquet je už komprimovaný -> ZIP jen jako obal (ZIP_STORED)
+        with zipfile.ZipFile(self.zip_path, "w", zipfile.ZIP_STORED) as zf:
+            for name, path in self.paths.items(): zf.write(path, f"{name}.parquet")
+        for path in self.paths.values(): os.remove(path)
+        return self.zip_path
+
+    def discard(self):
+        for writer in self.writers.values():
+            try: writer.close()
+            except Exception: pass
+        _remove_files(list(self.paths.values()) + [self.zip_path])
+
+
+class CsvSink:
+    # Jedna plochá tabulka: řádek = aktivita se sloupci ticketu (ticket bez aktivit = jeden řádek)
+    def __init__(self, base_path, compression="gzip"):
+        opener, suffix = CSV_COMPRESSIONS[compression]
+        self.path = base_path + suffix
+        self.file = opener(self.path, "wt", encoding="utf-8", newline="")
+        self.columns = TICKET_COLUMNS + ACTIVITY_COLUMNS[1:]
+        self.writer = csv.DictWriter(self.file, fieldnames=self.columns)
+        self.writer.writeheader()
+
+    def write(self, ticket_row, activity_rows):
+        if not activity_rows: self.writer.writerow(ticket_row)
+        else: self.writer.writerows(dict(ticket_row, **a) for a in activity_rows)
+
+    def close(self):
+        self.file.close()
+        return self.path
+
+    def discard(self):
+        try: self.file.close()
+        except OSError: pass
+        _remove_files([self.path])
+
+
+class ExportWriter:
+    def __init__(self, directory=EXPORT_DIR, prefix="daktela_", formats=(FORMAT_JSON,), parquet_compression="zstd", csv_compression="gzip"):
+        os.makedirs(directory, exist_ok=True)
+        # Úklid jen ve vlastním dočasném adresáři - cizí výstupní adresář (CLI) se nemaže
+        if directory == EXPORT_DIR: purge_stale_exports(directory)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        fd, self.json_path = tempfile.mkstemp(prefix=f"{prefix}{stamp}_", suffix=".json", dir=directory)
+        self.ids_path = self.json_path[:-len(".json")] + "_ids.txt"
+        self.json_file = os.fdopen(fd, "w", encoding="utf-8")
+        self.ids_file = open(self.ids_path, "w", encoding="utf-8")
+        # mkstemp zakládá 0600 -> stejná práva jako ostatní soubory exportu (podle umasky)
+        os.chmod(self.json_path, stat.S_IMODE(os.stat(self.ids_path).st_mode))
+        self.ids_file.write("SEZNAM ZPRACOVANÝCH ID\nDatum těžby: {}\n------------------------------\n".format(datetime.now().strftime('%d.%m.%Y %H:%M')))
+        self.json_file.write("[")
+        self.tickets = 0
+        self.activities = 0
+        self.preview = None
+        base_path = self.json_path[:-len(".json")]
+        self.sinks = {}
+        if FORMAT_PARQUET in formats: self.sinks[FORMAT_PARQUET] = ParquetSink(base_path, parquet_compression)
+        if FORMAT_CSV in formats: self.sinks[FORMAT_CSV] = CsvSink(base_path, csv_compression)
+        self.paths = {}
+
+    def write(self, ticket_entry):
+        # Element pole odsazený o 2 mezery = stejný výstup jako json.dumps(celý_seznam, indent=2)
+        chunk = json.dumps(ticket_entry, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+        self.json_file.write(("\n  " if self.tickets == 0 else ",\n  ") + chunk)
+        self.ids_file.write(("" if self.tickets == 0 else "\n") + str(ticket_entry['ticket_number']))
+        if self.preview is None: self.preview = ticket_entry
+        self.tickets += 1
+        self.activities += len(ticket_entry['activities'])
+        if self.sinks:
+            ticket_row, activity_rows = flatten_ticket(ticket_entry)
+            for sink in self.sinks.values(): sink.write(ticket_row, activity_rows)
+
+    def close(self):
+        self.json_file.write("\n]" if self.tickets else "]")
+        self.json_file.close()
+        self.ids_file.close()
+        self.paths = {fmt: sink.close() for fmt, sink in self.sinks.items()}
+        return self.handle()
+
+    def discard(self):
+        # Nedokončený běh (chyba) - nic nesmí zůstat, aby ho odběratel exportu nepovažoval za platný
+        for f in (self.json_file, self.ids_file):
+            try: f.close()
+            except OSError: pass
+        for sink in self.sinks.values(): sink.discard()
+        _remove_files([self.json_path, self.ids_path])
+
+    def handle(self):
+        size = os.path.getsize(self.json_path) if self.json_file.closed else self.json_file.tell()
+        return {"json_path": self.json_path, "ids_path": self.ids_path, "parquet_path": self.paths.get(FORMAT_PARQUET), "csv_path": self.paths.get(FORMAT_CSV),
+                "tickets": self.tickets, "activities": self.activities, "size_bytes": size, "preview": self.preview}
+
+
+def purge_stale_exports(directory=EXPORT_DIR, max_age_hours=STALE_EXPORT_HOURS):
+    # Exporty přerušených těžeb nebo ukončených relací, na které už nikdo nedrží handle
+    cutoff = time.time() - max_age_hours * 3600
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff: os.remove(path)
+        except OSError: pass
+
+
+def _remove_files(paths):
+    for path in paths:
+        if path and os.path.exists(path):
+            try: os.remove(path)
+            except OSError: pass
+
+
+def remove_export(handle):
+    # Úklid souborů předchozí těžby (volá se před novou těžbou / při resetu)
+    if not handle: return
+    _remove_files(handle.get(key) for key in ("json_path", "ids_path", "parquet_path", "csv_path"))
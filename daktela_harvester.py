@@ -1,13 +1,37 @@
+import time
+_T_SCRIPT = time.perf_counter()
+import logging
 import streamlit as st
-import requests
 import re
 import os
-import time
 import unicodedata
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, date
-from presidio_analyzer import AnalyzerEngine
-from presidio_anonymizer import AnonymizerEngine
+from daktela_anonymizer import AnonymizationPool, FastAnonymizer, MODE_FAST, MODE_PRESIDIO
+from daktela_client import AdaptiveConcurrency, DaktelaClient, BREAKER_CLOSED
+from daktela_cache import TicketCache, SearchResultCache
+from daktela_engine import ACTIVITY_TYPES, DEFAULT_FETCH_WORKERS, MAX_FETCH_WORKERS, SEARCH_PAGE_SIZE, SEARCH_WORKERS, build_search_params
+from daktela_export import remove_export, FORMAT_JSON, FORMAT_PARQUET, FORMAT_CSV, PARQUET_COMPRESSIONS, CSV_COMPRESSIONS
+from daktela_metrics import summary_rows, to_openmetrics
+from daktela_records import TicketList
+from daktela_jobs import JobManager, STATUS_RUNNING as JOB_RUNNING, STATUS_STOPPING as JOB_STOPPING, STATUS_EXPORTING as JOB_EXPORTING, STATUS_FINISHED as JOB_FINISHED, STATUS_FAILED as JOB_FAILED, RESUMABLE_STATUSES as JOB_RESUMABLE
+
+# --- MĚŘENÍ STARTU ---
+# Procesově sdílené (cache_resource) -> zaznamená se jen studený start, ne každý rerun
+logger = logging.getLogger("daktela_harvester")
+
+@st.cache_resource
+def get_startup_timings():
+    return {"import_s": time.perf_counter() - _T_SCRIPT}
+
+def mark_startup(key, seconds=None):
+    timings = get_startup_timings()
+    if key not in timings:
+        timings[key] = time.perf_counter() - _T_SCRIPT if seconds is None else seconds
+        logger.info("startup %s: %.3f s", key, timings[key])
+
+get_startup_timings()
 
 # --- 1. FUNKČNÍ FIREMNÍ AUTENTIZACE ---
 if 'authenticated' not in st.session_state:
@@ -31,6 +55,7 @@ if not st.session_state.authenticated:
             st.rerun()
         else:
             st.error("Nesprávné heslo.")
+    mark_startup("first_render_s")
     st.stop()
 
 # --- 2. KONFIGURACE DAKTELA ---
@@ -38,23 +63,100 @@ INSTANCE_URL = st.secrets["DAKTELA_URL"]
 ACCESS_TOKEN = st.secrets["DAKTELA_TOKEN"]
 
 # --- KONFIGURACE A POMOCNÉ FUNKCE ---
-CARRIERS_DATA = {
-    "cp": "Česká pošta", "ppl": "PPL", "dpd": "DPD", "geis": "Geis", "gls": "GLS",
-    "zasilkovna": "Zásilkovna", "intime": "We Do", "toptrans": "Top Trans", "pbh": "Pošta Bez Hranic",
-    "dhl": "DHL", "sp": "Slovenská pošta", "ups": "UPS", "tnt": "TNT", "sps": "SK Parcel Service",
-    "gw": "Gebrüder Weiss SK", "gwcz": "Gebrüder Weiss CZ", "dhlde": "DHL DE", "messenger": "Messenger",
-    "fofr": "Fofr", "fedex": "Fedex", "dachser": "Dachser", "raben": "Raben", "dhlfreightec": "DHL Freight Euroconnect",
-    "dhlparcel": "DHL Parcel Europe", "liftago": "Kurýr na přesný čas", "dbschenker": "DB Schenker",
-    "dsv": "DSV", "spring": "Spring", "kurier": "123 Kuriér", "airway": "Airway", "japo": "JAPO Transport",
-    "magyarposta": "Magyar Posta", "sameday": "Sameday", "sds": "SLOVENSKÝ DORUČOVACÍ SYSTÉM",
-    "inpost": "InPost", "onebyallegro": "One by Allegro"
-}
+# Globální strop požadavků/s na Daktelu; souběžnost (DEFAULT_FETCH_WORKERS až MAX_FETCH_WORKERS) řídí klient podle odezvy API
+API_RATE_LIMIT = 10.0
+# Anonymizace běží v samostatných procesech (každý drží vlastní spaCy model ~1 GB RAM)
+ANON_PROCESSES = 2
+ANON_BATCH_SIZE = 32
+JOB_POLL_SECONDS = 1.0
+JOB_LIST_LIMIT = 10
+JOB_STATUS_LABELS = {JOB_RUNNING: "⛏️ běží", JOB_STOPPING: "🛑 zastavuje se", JOB_EXPORTING: "💾 export", JOB_FINISHED: "✅ hotovo", JOB_FAILED: "❌ selhal"}
+# Sdílené mezi relacemi: číselníky (kategorie, statusy) a výsledky hledání podle filtru
+DICTIONARY_TTL_SECONDS = 3600
+SEARCH_CACHE_TTL_SECONDS = 600
+SEARCH_CACHE_MAX_MB = 256
+EXPORT_FORMATS = {"Parquet (tickets + activities)": FORMAT_PARQUET, "CSV (plochá tabulka aktivit)": FORMAT_CSV}
+CONCURRENCY_EVENTS = {"decrease": "⬇️ snížení limitu", "pause": "⏳ pauza (Retry-After)", "open": "🔌 jistič rozpojen", "half_open": "🔎 zkušební požadavek", "closed": "✅ API opět odpovídá"}
+ANON_MODES = {"⚡ Rychlá (regex: e-mail, telefon, IP, IBAN, hesla)": MODE_FAST, "🧠 Důkladná (Presidio NER, pomalejší)": MODE_PRESIDIO}
 
 @st.cache_resource
-def load_anonymizer():
-    return AnalyzerEngine(), AnonymizerEngine()
+def get_client():
+    return DaktelaClient(INSTANCE_URL, ACCESS_TOKEN, pool_size=MAX_FETCH_WORKERS, rate_limit=API_RATE_LIMIT,
+                         concurrency=AdaptiveConcurrency(initial=DEFAULT_FETCH_WORKERS, max_limit=MAX_FETCH_WORKERS))
 
-analyzer, anonymizer = load_anonymizer()
+@st.cache_resource
+def get_cache():
+    return TicketCache()
+
+@st.cache_resource
+def get_anonymization_pool():
+    return AnonymizationPool(processes=ANON_PROCESSES, batch_size=ANON_BATCH_SIZE)
+
+@st.cache_resource
+def get_fast_anonymizer():
+    return FastAnonymizer()
+
+@st.cache_resource
+def get_search_cache():
+    return SearchResultCache(max_mb=SEARCH_CACHE_MAX_MB, ttl_seconds=SEARCH_CACHE_TTL_SECONDS)
+
+@st.cache_data(ttl=DICTIONARY_TTL_SECONDS, show_spinner=False)
+def load_dictionaries():
+    # Kategorie a statusy pro všechny relace najednou (oba požadavky souběžně); chyba se necachuje
+    client = get_client()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        cat_fut, stat_fut = executor.submit(client.ticket_categories), executor.submit(client.statuses)
+        by_title = lambda x: x.get('title', '').lower()
+        return sorted(cat_fut.result(), key=by_title), sorted(stat_fut.result(), key=by_title)
+
+def search_tickets_shared(params, on_progress=None, refresh=False):
+    # (tickety, čas uložení do sdílené cache | None = čerstvě z API)
+    search_cache = get_search_cache()
+    key = SearchResultCache.key(params)
+    if not refresh:
+        hit = search_cache.get(key)
+        if hit: return hit
+    tickets = get_client().search_tickets(params, page_size=SEARCH_PAGE_SIZE, workers=SEARCH_WORKERS, on_progress=on_progress)
+    # V relaci i ve sdílené cache se drží jen kompaktní záznamy, surové tickety se hned uvolní
+    records = TicketList.from_api(tickets)
+    search_cache.put(key, records)
+    return records, None
+
+@st.cache_resource
+def get_job_manager():
+    # Procesově sdílený - běžící joby přežijí rerun, zavření záložky i novou relaci
+    return JobManager()
+
+def load_job_export(job_id):
+    # Export dokončeného jobu (chybějící soubory se sestaví znovu z checkpointu); jinak hláška a návrat na začátek
+    try: return get_job_manager().ensure_export(job_id)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        st.error(f"Export jobu už není k dispozici a nepodařilo se ho obnovit: {e}")
+        if st.button("⬅️ Zpět na vyhledávání", use_container_width=True):
+            st.session_state.harvester_phase = "filter"
+            st.session_state.pop('job_id', None)
+            st.query_params.clear()
+            st.rerun()
+        st.stop()
+
+def export_download(path, fmt_name, label, file_name, mime=None):
+    # download_button načte data do paměti Streamlitu při každém rerunu -> export až na vyžádání
+    # a vždy jen jeden připravený formát (klíčem je cesta, nový export začíná nepřipravený)
+    if st.session_state.get('download_ready') != path:
+        if st.button(f"📦 Připravit {fmt_name} ke stažení", key=f"prepare_{path}", use_container_width=True):
+            st.session_state.download_ready = path
+            st.rerun()
+        return
+    with open(path, "rb") as f: st.download_button(label=label, data=f, file_name=file_name, mime=mime, key=f"download_{path}", use_container_width=True)
+
+def start_harvest_job(job_id):
+    # Spuštění i obnovení jobu; anonymizér podle režimu uloženého v parametrech jobu
+    job_manager = get_job_manager()
+    anon_pool = get_anonymization_pool() if job_manager.params(job_id).get('anon_mode') == MODE_PRESIDIO else get_fast_anonymizer()
+    if isinstance(anon_pool, AnonymizationPool): anon_pool.warm_up()
+    job_manager.start(job_id, get_client(), get_cache(), anon_pool)
+    st.session_state.job_id = job_id
+    st.query_params["job"] = job_id
 
 def slugify(text):
     if not text: return "export"
@@ -62,47 +164,6 @@ def slugify(text):
     text = re.sub(r'[^\w\s-]', '', text).strip().lower()
     return re.sub(r'[-\s]+', '_', text)
 
-def anonymize_text(text):
-    if not text: return ""
-    text = re.sub(r'(?i)(heslo|password|pwd|pass|access_token)(\s*[:=]\s*)(\S+)', r'\1\2[HESLO]', text)
-    text = re.sub(r'(\+?420\s?|(?:\b))(\d{3}\s?\d{3}\s?\d{3})\b', '[TELEFON]', text)
-    results = analyzer.analyze(text=text, entities=["EMAIL_ADDRESS", "PHONE_NUMBER", "IP_ADDRESS"], language='en')
-    anonymized_result = anonymizer.anonymize(text=text, analyzer_results=results)
-    return anonymized_result.text
-
-def clean_html(raw_html):
-    if not raw_html: return ""
-    cleantext = raw_html.replace('</p>', '\n').replace('<br>', '\n').replace('<br />', '\n').replace('</div>', '\n').replace('&nbsp;', ' ')
-    cleanr = re.compile('<style.*?>.*?</style>|<script.*?>.*?</script>', re.DOTALL)
-    cleantext = re.sub(cleanr, '', cleantext)
-    cleanr = re.compile('<.*?>')
-    cleantext = re.sub(cleanr, '', cleantext)
-    cleantext = cleantext.replace('&lt;', '<').replace('&gt;', '>').replace('&amp;', '&')
-    patterns = [r'From:.*', r'Dne\s.*\snapsal/a:', r'----------\s*Původní zpráva\s*----------', r'On\s.*\swrote:', r'____________________________________________']
-    for pattern in patterns:
-        cleantext = re.split(pattern, cleantext, flags=re.IGNORECASE)[0]
-    cleantext = re.sub(r'\n\s*\n', '\n\n', cleantext)
-    return anonymize_text(cleantext.strip())
-
-def format_date_split(date_str):
-    if not date_str: return "N/A", "N/A"
-    try:
-        dt = datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
-        return dt.strftime('%d.%m.%Y'), dt.strftime('%H:%M:%S')
-    except: return date_str, "N/A"
-
-def identify_side(title, email, is_user=False):
-    if is_user:
-        return f"Balíkobot ({title})" if title and title.lower() != "balikobot" else "Balíkobot"
-    clean_title = title.lower() if title else ""
-    clean_email = email.lower() if email else ""
-    if "balikobot" in clean_email or "balikobot" in clean_title:
-        return f"Balíkobot ({title})" if title and title.lower() != "balikobot" else "Balíkobot"
-    for slug, name in CARRIERS_DATA.items():
-        if (slug and f"@{slug}." in clean_email) or (slug and clean_email.endswith(f"@{slug}.com")) or (name.lower() in clean_title):
-            return f"Dopravce ({name})"
-    return f"Klient ({title})" if title else "Klient"
-
 # --- GLOBÁLNÍ CALLBACK FUNKCE ---
 def set_date_range(d_from, d_to):
     st.session_state.filter_date_from = d_from
@@ -182,6 +243,11 @@ st.markdown("""
 
 if 'current_app' not in st.session_state:
     st.session_state.current_app = "dashboard"
+    # Po obnovení stránky / novém přihlášení se připojí k jobu z URL (?job=...)
+    if get_job_manager().exists(st.query_params.get("job")):
+        st.session_state.job_id = st.query_params["job"]
+        st.session_state.current_app = "harvester"
+        st.session_state.harvester_phase = "processing"
 
 # --- DASHBOARD ---
 if st.session_state.current_app == "dashboard":
@@ -212,6 +278,11 @@ if st.session_state.current_app == "dashboard":
                         show_wip_msg(item["action"])
         st.write("")
 
+    with st.expander("⏱️ Diagnostika startu"):
+        timings = get_startup_timings()
+        st.caption(f"Import: {timings.get('import_s', 0):.2f} s · První vykreslení: {timings['first_render_s']:.2f} s" if 'first_render_s' in timings else f"Import: {timings.get('import_s', 0):.2f} s")
+        st.caption(f"Načtení modelu Presidio: {timings['model_load_s']:.1f} s" if 'model_load_s' in timings else "Model Presidio zatím nebyl načten (načítá se až při potřebě).")
+
 # --- APLIKACE: HARVESTER (ANALÝZA TICKETŮ) ---
 elif st.session_state.current_app == "harvester":
     
@@ -231,34 +302,33 @@ elif st.session_state.current_app == "harvester":
     # Zde definujeme stavy pro "State Machine"
     # Fáze: "filter" -> "selection" -> "processing" -> "results"
     if 'harvester_phase' not in st.session_state: st.session_state.harvester_phase = "filter"
+    # Běžící job relace má přednost (i po návratu z menu) - průběh, zastavení a výsledky zůstanou dostupné
+    # a nedá se omylem spustit druhá těžba
+    if st.session_state.harvester_phase in ("filter", "selection") and get_job_manager().is_alive(st.session_state.get('job_id')):
+        st.session_state.harvester_phase = "processing"
     
-    if 'stop_requested' not in st.session_state: st.session_state.stop_requested = False
-    if 'export_data' not in st.session_state: st.session_state.export_data = []
-    if 'id_list_txt' not in st.session_state: st.session_state.id_list_txt = ""
+    if 'export' not in st.session_state: st.session_state.export = None # handle souborů exportu (data jsou na disku)
     if 'stats' not in st.session_state: st.session_state.stats = {}
-    if 'found_tickets' not in st.session_state: st.session_state.found_tickets = [] 
+    if 'found_tickets' not in st.session_state: st.session_state.found_tickets = TicketList() # kompaktní záznamy (daktela_records)
     if 'filter_date_from' not in st.session_state: st.session_state.filter_date_from = date.today()
     if 'filter_date_to' not in st.session_state: st.session_state.filter_date_to = date.today()
     if 'selected_cat_key' not in st.session_state: st.session_state.selected_cat_key = "ALL"
     if 'selected_stat_key' not in st.session_state: st.session_state.selected_stat_key = "ALL"
 
-    # Načtení číselníků
-    if 'categories' not in st.session_state:
-        try:
-            res_cat = requests.get(f"{INSTANCE_URL}/api/v6/ticketsCategories.json", headers={'x-auth-token': ACCESS_TOKEN})
-            cat_data = res_cat.json().get('result', {}).get('data', [])
-            st.session_state['categories'] = sorted(cat_data, key=lambda x: x.get('title', '').lower())
-            res_stat = requests.get(f"{INSTANCE_URL}/api/v6/statuses.json", headers={'x-auth-token': ACCESS_TOKEN})
-            stat_data = res_stat.json().get('result', {}).get('data', [])
-            st.session_state['statuses'] = sorted(stat_data, key=lambda x: x.get('title', '').lower())
-        except:
-            st.error("Nepodařilo se načíst číselníky.")
-            st.stop()
+    # Načtení číselníků (sdílená cache s TTL, viz load_dictionaries)
+    try: categories, statuses = load_dictionaries()
+    except:
+        st.error("Nepodařilo se načíst číselníky.")
+        st.stop()
 
     cat_options_map = {"VŠE (bez filtru)": "ALL"}
-    cat_options_map.update({c['title']: c['name'] for c in st.session_state['categories']})
+    cat_options_map.update({c['title']: c['name'] for c in categories})
     stat_options_map = {"VŠE (bez filtru)": "ALL"}
-    stat_options_map.update({s['title']: s['name'] for s in st.session_state['statuses']})
+    stat_options_map.update({s['title']: s['name'] for s in statuses})
+
+    # Model Presidio se načítá líně: při posledním použitém režimu Presidio se workery
+    # zahřívají na pozadí už během nastavování filtrů
+    if st.session_state.get('anon_mode') == MODE_PRESIDIO: get_anonymization_pool().warm_up()
 
     # =========================================================================
     # STATE MACHINE - HLAVNÍ LOGIKA
@@ -293,45 +363,41 @@ elif st.session_state.current_app == "harvester":
                 sel_stat_label = st.selectbox("Status", options=list(stat_options_map.keys()), index=stat_idx, key="sb_status")
                 st.session_state.selected_stat_key = stat_options_map[sel_stat_label]
                 st.button("Vybrat vše (Status)", use_container_width=True, on_click=reset_stat_callback)
+            if st.button("🔄 Obnovit číselníky (kategorie, statusy)", use_container_width=True):
+                load_dictionaries.clear()
+                st.rerun()
 
             st.write("")
             if st.button("🔍 VYHLEDAT TICKETY", type="primary", use_container_width=True):
                 # Příprava parametrů
-                params = {"filter[logic]": "and", "filter[filters][0][field]": "created", "filter[filters][0][operator]": "gte", "filter[filters][0][value]": f"{st.session_state.filter_date_from} 00:00:00", "filter[filters][1][field]": "created", "filter[filters][1][operator]": "lte", "filter[filters][1][value]": f"{st.session_state.filter_date_to} 23:59:59", "fields[0]": "name", "fields[1]": "title", "fields[2]": "created", "fields[3]": "customFields", "fields[4]": "category", "fields[5]": "statuses"}
-                filter_idx = 2
-                if st.session_state.selected_cat_key != "ALL": params[f"filter[filters][{filter_idx}][field]"] = "category"; params[f"filter[filters][{filter_idx}][operator]"] = "eq"; params[f"filter[filters][{filter_idx}][value]"] = st.session_state.selected_cat_key; filter_idx += 1
-                if st.session_state.selected_stat_key != "ALL": params[f"filter[filters][{filter_idx}][field]"] = "statuses"; params[f"filter[filters][{filter_idx}][operator]"] = "eq"; params[f"filter[filters][{filter_idx}][value]"] = st.session_state.selected_stat_key; filter_idx += 1
+                params = build_search_params(st.session_state.filter_date_from, st.session_state.filter_date_to, st.session_state.selected_cat_key, st.session_state.selected_stat_key)
                 
                 with st.spinner("Prohledávám databázi (může to chvíli trvat)..."):
+                    search_progress = st.empty()
+                    def show_search_progress(fetched, total):
+                        search_progress.caption(f"📥 Staženo **{fetched}** / {total} ticketů" if total else f"📥 Staženo **{fetched}** ticketů")
                     try:
-                        # --- PAGINATION LOGIC (WHILE LOOP) ---
-                        all_tickets = []
-                        params["take"] = 1000
-                        params["skip"] = 0
-                        
-                        while True:
-                            res = requests.get(f"{INSTANCE_URL}/api/v6/tickets.json", params=params, headers={'X-AUTH-TOKEN': ACCESS_TOKEN})
-                            res.raise_for_status() # Check for errors
-                            data = res.json().get('result', {}).get('data', [])
-                            
-                            if not data:
-                                break
-                                
-                            all_tickets.extend(data)
-                            
-                            # Pokud je vráceno méně než limit (1000), je to poslední stránka
-                            if len(data) < 1000:
-                                break
-                                
-                            params["skip"] += 1000
-                            # Volitelné: sleep pro odlehčení API
-                            # time.sleep(0.1)
-                            
-                        st.session_state.found_tickets = all_tickets
+                        # --- PAGINATION (take/skip po 1000, stránky paralelně) ---
+                        st.session_state.found_tickets, st.session_state.search_cached_at = search_tickets_shared(params, on_progress=show_search_progress)
+                        st.session_state.search_params = params
                         st.session_state.harvester_phase = "selection" # PŘECHOD NA DALŠÍ FÁZI
                         st.rerun()
                     except Exception as e: st.error(f"Chyba při komunikaci s API: {e}")
 
+        # Joby ostatních relací / před restartem - otevřít průběh, pokračovat nebo stáhnout výsledek
+        recent_jobs = get_job_manager().list_jobs()[:JOB_LIST_LIMIT]
+        if recent_jobs:
+            with st.expander(f"🗂️ Poslední těžby ({len(recent_jobs)})"):
+                for job_id, job_state in recent_jobs:
+                    c_job1, c_job2, c_job3 = st.columns([2, 2, 1])
+                    c_job1.caption(f"{datetime.fromtimestamp(job_state.get('created', 0)).strftime('%d.%m.%Y %H:%M')} · {job_state.get('written', 0)}/{job_state.get('total', 0)} ticketů")
+                    c_job2.caption(JOB_STATUS_LABELS.get(job_state.get("status"), "⏸️ přerušeno"))
+                    if c_job3.button("Otevřít", key=f"open_job_{job_id}", use_container_width=True):
+                        st.session_state.job_id = job_id
+                        st.query_params["job"] = job_id
+                        st.session_state.harvester_phase = "processing"
+                        st.rerun()
+
     # -------------------------------------------------------------------------
     # FÁZE 2: VÝSLEDEK HLEDÁNÍ + LIMIT
     # -------------------------------------------------------------------------
@@ -351,12 +417,23 @@ elif st.session_state.current_app == "harvester":
             st.warning("⚠️ V zadaném období a nastavení nebyly nalezeny žádné tickety.")
         else:
             st.success(f"✅ Nalezeno **{count}** ticketů.")
+            if st.session_state.get('search_cached_at'):
+                c_cached1, c_cached2 = st.columns([3, 1])
+                c_cached1.caption(f"♻️ Výsledek ze sdílené cache (hledáno před {int((time.time() - st.session_state.search_cached_at) / 60)} min). Nové tickety se mohly mezitím objevit.")
+                if c_cached2.button("🔄 Aktualizovat", use_container_width=True):
+                    with st.spinner("Prohledávám databázi..."):
+                        try: st.session_state.found_tickets, st.session_state.search_cached_at = search_tickets_shared(st.session_state.search_params, refresh=True)
+                        except Exception as e: st.error(f"Chyba při komunikaci s API: {e}")
+                        else: st.rerun()
             
             ts = datetime.now().strftime("%Y%m%d_%H%M%S")
             c_name = "VSE" if st.session_state.selected_cat_key == "ALL" else slugify(next((k for k,v in cat_options_map.items() if v == st.session_state.selected_cat_key), "cat"))
             s_name = "VSE" if st.session_state.selected_stat_key == "ALL" else slugify(next((k for k,v in stat_options_map.items() if v == st.session_state.selected_stat_key), "stat"))
             
-            found_ids_txt = "\n".join([str(t.get('name', '')) for t in st.session_state.found_tickets])
+            filter_desc = (f"📅 **Období:** {st.session_state.filter_date_from.strftime('%d.%m.%Y')} - {st.session_state.filter_date_to.strftime('%d.%m.%Y')}\n\n"
+                           f"📂 **Kategorie:** {next((k for k,v in cat_options_map.items() if v == st.session_state.selected_cat_key), 'VŠE')}\n\n"
+                           f"🏷️ **Status:** {next((k for k,v in stat_options_map.items() if v == st.session_state.selected_stat_key), 'VŠE')}")
+            found_ids_txt = st.session_state.found_tickets.ids_text # počítá se jednou, ne při každém rerunu
             
             col_d1, col_d2, col_d3 = st.columns([1, 2, 1])
             with col_d2:
@@ -365,11 +442,50 @@ elif st.session_state.current_app == "harvester":
             st.write("")
             st.write("Kolik ticketů chcete hloubkově zpracovat?")
             limit_val = st.number_input("Limit (0 = zpracovat všechny nalezené)", min_value=0, max_value=count, value=min(count, 50))
+            workers_val = st.number_input("Max. počet paralelních stahování (skutečný počet se řídí odezvou API)", min_value=1, max_value=MAX_FETCH_WORKERS, value=st.session_state.get('final_workers', MAX_FETCH_WORKERS))
+            anon_mode_label = st.radio("Režim anonymizace", options=list(ANON_MODES.keys()), index=list(ANON_MODES.values()).index(st.session_state.get('anon_mode', MODE_FAST)))
+            if ANON_MODES[anon_mode_label] == MODE_PRESIDIO:
+                anon_pool = get_anonymization_pool()
+                anon_pool.warm_up()
+                if anon_pool.is_ready() and anon_pool.load_seconds() is not None: mark_startup("model_load_s", anon_pool.load_seconds()); st.caption("🧠 Model Presidio je připraven.")
+                else: st.caption("🧠 Model Presidio se načítá na pozadí...")
+            force_refresh_val = st.checkbox("🔄 Vynutit obnovení (ignorovat lokální cache)", value=False)
+            diff_mode_val = st.checkbox("✂️ U odpovědí ukládat jen nový text (bez citované historie vlákna)", value=st.session_state.get('diff_mode', False))
+            activity_types_val = st.multiselect("Typy aktivit (prázdné = všechny)", options=ACTIVITY_TYPES, default=st.session_state.get('activity_types', []))
+            # JSON se vytváří vždy; sloupcové formáty se plní průběžně ze stejných záznamů
+            c_fmt1, c_fmt2, c_fmt3 = st.columns([2, 1, 1])
+            with c_fmt1: formats_val = st.multiselect("Další formáty exportu (JSON je vždy)", options=list(EXPORT_FORMATS.keys()), default=[k for k, v in EXPORT_FORMATS.items() if v in st.session_state.get('export_formats', [])])
+            with c_fmt2: parquet_comp_val = st.selectbox("Komprese Parquet", options=PARQUET_COMPRESSIONS)
+            with c_fmt3: csv_comp_val = st.selectbox("Komprese CSV", options=list(CSV_COMPRESSIONS.keys()))
+            cache_stats = get_cache().stats()
+            st.caption(f"🗄️ Lokální cache: {cache_stats['activity_sets']} ticketů s aktivitami, {cache_stats['size_mb']:.1f} MB")
             st.write("")
             
             if st.button("⛏️ SPUSTIT ZPRACOVÁNÍ DAT", type="primary", use_container_width=True):
                 st.session_state.final_limit = limit_val
-                st.session_state.stop_requested = False
+                st.session_state.final_workers = workers_val
+                st.session_state.force_refresh = force_refresh_val
+                st.session_state.diff_mode = diff_mode_val
+                st.session_state.activity_types = activity_types_val
+                st.session_state.export_formats = [EXPORT_FORMATS[f] for f in formats_val]
+                st.session_state.export_compression = {"parquet": parquet_comp_val, "csv": csv_comp_val}
+                st.session_state.anon_mode = ANON_MODES[anon_mode_label]
+                # Předchozí export se uklidí; nový vznikne až po dokončení jobu
+                # Sdílený výsledek hledání může mít zastaralé 'edited' (klíč lokální cache aktivit) -> slouží jen
+                # pro náhled; vstup jobu je vždy z čerstvého hledání, jinak by chyběly nové odpovědi
+                if st.session_state.get('search_cached_at'):
+                    with st.spinner("Ověřuji aktuálnost ticketů..."):
+                        try: st.session_state.found_tickets, st.session_state.search_cached_at = search_tickets_shared(st.session_state.search_params, refresh=True)
+                        except Exception as e:
+                            st.error(f"Chyba při komunikaci s API: {e}")
+                            st.stop()
+                remove_export(st.session_state.export)
+                st.session_state.export = None
+                tickets_to_process = st.session_state.found_tickets.to_api(limit_val)
+                job_params = {"workers": workers_val, "force_refresh": force_refresh_val, "diff_mode": diff_mode_val, "activity_types": activity_types_val or None, "anon_mode": st.session_state.anon_mode,
+                              "export_formats": [FORMAT_JSON] + st.session_state.export_formats, "export_compression": st.session_state.export_compression,
+                              "filter_desc": filter_desc, "file_tag": f"{c_name}_{s_name}"}
+                start_harvest_job(get_job_manager().create(tickets_to_process, job_params))
                 st.session_state.harvester_phase = "processing" # PŘECHOD NA ZPRACOVÁNÍ
                 st.rerun()
 
@@ -377,105 +493,75 @@ elif st.session_state.current_app == "harvester":
     # FÁZE 3: PROCESSING (BĚŽÍ TĚŽBA)
     # -------------------------------------------------------------------------
     elif st.session_state.harvester_phase == "processing":
-        
+        # Těžba běží v background jobu - tady se jen čte jeho stav a stránka se periodicky obnovuje
+        job_manager = get_job_manager()
+        job_id = st.session_state.get('job_id')
+        if not job_manager.exists(job_id):
+            st.session_state.harvester_phase = "selection" if st.session_state.found_tickets else "filter"
+            st.rerun()
+        job_params = job_manager.params(job_id)
+        job_state = job_manager.state(job_id)
+        job_status = job_state.get("status")
+
         with st.container(border=True):
-            st.info(f"**Právě zpracovávám data pro:**\n\n"
-                    f"📅 **Období:** {st.session_state.filter_date_from.strftime('%d.%m.%Y')} - {st.session_state.filter_date_to.strftime('%d.%m.%Y')}\n\n"
-                    f"📂 **Kategorie:** {next((k for k,v in cat_options_map.items() if v == st.session_state.selected_cat_key), 'VŠE')}\n\n"
-                    f"🏷️ **Status:** {next((k for k,v in stat_options_map.items() if v == st.session_state.selected_stat_key), 'VŠE')}")
+            st.info(f"**Právě zpracovávám data pro:**\n\n{job_params.get('filter_desc', '')}")
         
         st.write("")
         st.subheader("3. Probíhá těžba dat...")
         st.write("")
 
+        total_count = job_state.get("total", 0)
+        processed = job_state.get("processed", 0)
+        st.progress(processed / total_count if total_count else 1.0)
+        if job_status == JOB_RUNNING:
+            st.markdown(f"📥 Zpracovávám ticket **{processed}/{total_count}**: `{job_state.get('current') or ''}`")
+            if job_state.get("eta_seconds") is not None: st.caption(f"⏱️ Zbývá cca: {int(job_state['eta_seconds'])} sekund")
+        elif job_status == JOB_STOPPING: st.markdown("🛑 Zastavuji (dokončuji rozpracované tickety)...")
+        elif job_status == JOB_EXPORTING: st.markdown("💾 Sestavuji export...")
+        elif job_status == JOB_FAILED: st.error(f"Těžba selhala: {job_state.get('error')}")
+        elif job_status in JOB_RESUMABLE: st.warning(f"⏸️ Těžba je přerušená - hotovo **{job_state.get('written', 0)}** z {total_count} ticketů. Lze pokračovat od místa přerušení.")
+        concurrency = job_state.get("concurrency")
+        if concurrency and job_status in (JOB_RUNNING, JOB_STOPPING):
+            st.caption(f"🚦 Souběžnost: limit **{concurrency['limit']}**/{concurrency['max_limit']} · právě běží {concurrency['in_flight']} požadavků · strop {API_RATE_LIMIT:.0f} požadavků/s")
+            if concurrency["state"] != BREAKER_CLOSED: st.warning(f"🔌 API opakovaně selhává - stahování stojí (jistič: {concurrency['state']}, pauza {concurrency['paused_s']:.0f} s)")
+            elif concurrency["paused_s"] > 0: st.caption(f"⏳ API požádalo o zpomalení (Retry-After) - pauza {concurrency['paused_s']:.0f} s")
+        if concurrency and concurrency["events"]:
+            with st.expander(f"🚦 Řízení souběžnosti ({concurrency['counters']['decreases']} snížení, {concurrency['counters']['pauses']} pauz)"):
+                st.caption(" · ".join(f"{k}: {v}" for k, v in concurrency["counters"].items()))
+                st.dataframe([{"čas": datetime.fromtimestamp(e["time"]).strftime('%H:%M:%S'), "událost": CONCURRENCY_EVENTS.get(e["event"], e["event"]), "limit": e["limit"], "detail": e["detail"]} for e in reversed(concurrency["events"])],
+                             hide_index=True, use_container_width=True)
+        if job_state.get("metrics"):
+            with st.expander("📊 Výkon po fázích (živě)"):
+                rates = job_state["metrics"]["rates"]
+                st.caption(f"🎫 {rates['tickets_per_s']:.1f} ticketů/s · 💬 {rates['activities_per_s']:.1f} aktivit/s · 🗄️ z cache: {job_state['metrics']['counters'].get('cache_hits', 0)}")
+                st.dataframe(summary_rows(job_state["metrics"]), hide_index=True, use_container_width=True)
+
         col_stop1, col_stop2, col_stop3 = st.columns([1, 2, 1])
         with col_stop2:
-            if st.button("🛑 ZASTAVIT PROCES", use_container_width=True):
-                st.session_state.stop_requested = True
-                # Návrat do selection nebo filter? Spíše do selection, aby viděl co našel.
-                st.session_state.harvester_phase = "selection" 
-                st.rerun()
-
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        eta_text = st.empty()
-
-        # Logika těžby - PŘÍPRAVA
-        noise_patterns = [r"Potvrzujeme, že Vaše zpráva byla úspěšně doručena", r"Jelikož Vám chceme poskytnout nejlepší servis", r"dnes ve dnech .* čerpám dovolenou"]
-        combined_cut_regex = re.compile(r"(S pozdravem|S pozdravom|Kind regards|Regards|S přáním pěkného dne|S přáním hezkého dne|Děkuji\n|Ďakujem\n|Díky\n|Tento e-mail nepředstavuje nabídku|Pro případ, že tato zpráva obsahuje návrh smlouvy|Disclaimer:|Confidentiality Notice:|Myslete na životní prostředí|Please think about the environment|-{5,}|_{5,}|---------- Odpovězená zpráva ----------|Dne .* odesílatel .* napsal\(a\):|Od: .* Posláno: .*|---------- Původní e-mail ----------)", re.IGNORECASE | re.MULTILINE)
-
-        tickets_to_process = st.session_state.found_tickets
-        if st.session_state.final_limit > 0:
-            tickets_to_process = tickets_to_process[:st.session_state.final_limit]
-
-        full_export_data = []
-        start_time = time.time()
-        total_count = len(tickets_to_process)
-
-        # SMYČKA TĚŽBY
-        for idx, t_obj in enumerate(tickets_to_process):
-            if st.session_state.stop_requested: break
-            t_num = t_obj.get('name')
-            status_text.markdown(f"📥 Zpracovávám ticket **{idx + 1}/{total_count}**: `{t_num}`")
-            
-            try:
-                acts = []
-                for attempt in range(3):
-                    try:
-                        res_act = requests.get(f"{INSTANCE_URL}/api/v6/tickets/{t_num}/activities.json", headers={'X-AUTH-TOKEN': ACCESS_TOKEN}, timeout=30)
-                        res_act.raise_for_status()
-                        acts = res_act.json().get('result', {}).get('data', [])
-                        break
-                    except: time.sleep(1)
-                
-                t_date, t_time = format_date_split(t_obj.get('created'))
-                t_status = t_obj.get('statuses', [{}])[0].get('title', 'N/A') if isinstance(t_obj.get('statuses'), list) and t_obj.get('statuses') else "N/A"
-                custom_fields = t_obj.get('customFields', {})
-                vip_list = custom_fields.get('vip', [])
-                ticket_clientType = "VIP" if "→ VIP KLIENT ←" in vip_list else "Standard"
-                
-                ticket_entry = {"ticket_number": t_num, "ticket_name": t_obj.get('title', 'Bez předmětu'), "ticket_clientType": ticket_clientType, "ticket_category": t_obj.get('category', {}).get('title', 'N/A') if t_obj.get('category') else "N/A", "ticket_status": t_status, "ticket_creationDate": t_date, "ticket_creationTime": t_time, "activities": []}
-
-                for a_idx, act in enumerate(sorted(acts, key=lambda x: x.get('time', '')), 1):
-                    item = act.get('item') or {}
-                    address = item.get('address', '')
-                    cleaned = clean_html(item.get('text') or act.get('description'))
-                    if not cleaned: continue
-                    if any(re.search(p, cleaned, re.IGNORECASE) for p in noise_patterns): cleaned = "[AUTOMATICKÝ EMAIL BALÍKOBOTU]"
-                    else:
-                        match = combined_cut_regex.search(cleaned)
-                        if match: cleaned = cleaned[:match.start()].strip() + "\n\n[PODPIS]"
-                    u_title = (act.get('user') or {}).get('title')
-                    c_title = (act.get('contact') or {}).get('title')
-                    direction = item.get('direction', 'out')
-                    if direction == "in": sender = identify_side(c_title, address, is_user=False); recipient = "Balíkobot"
-                    else: sender = identify_side(u_title, "", is_user=True); recipient = identify_side(c_title, address, is_user=False)
-                    a_date, a_time = format_date_split(act.get('time'))
-                    act_type = act.get('type') or "COMMENT"
-                    act_data = {"activity_number": a_idx, "activity_type": act_type, "activity_sender": sender}
-                    if act_type != "COMMENT": act_data["activity_recipient"] = recipient
-                    act_data.update({"activity_creationDate": a_date, "activity_creationTime": a_time, "activity_text": cleaned})
-                    ticket_entry["activities"].append(act_data)
-                
-                full_export_data.append(ticket_entry)
-            except Exception: pass
-
-            progress_bar.progress((idx + 1) / total_count)
-            elapsed = time.time() - start_time
-            if idx > 0:
-                avg_per_item = elapsed / (idx + 1)
-                remaining_sec = (total_count - (idx + 1)) * avg_per_item
-                eta_text.caption(f"⏱️ Zbývá cca: {int(remaining_sec)} sekund")
-
-        # HOTOVO -> PŘECHOD NA VÝSLEDKY
-        final_ids_list = "SEZNAM ZPRACOVANÝCH ID\nDatum těžby: {}\n------------------------------\n".format(datetime.now().strftime('%d.%m.%Y %H:%M'))
-        final_ids_list += "\n".join([str(t['ticket_number']) for t in full_export_data])
-
-        st.session_state.stats = {"tickets": len(full_export_data), "activities": sum(len(t['activities']) for t in full_export_data), "size": f"{len(json.dumps(full_export_data).encode('utf-8')) / 1024:.1f} KB"}
-        st.session_state.export_data = full_export_data
-        st.session_state.id_list_txt = final_ids_list
-        st.session_state.harvester_phase = "results" # PŘECHOD
-        st.rerun()
+            if job_status == JOB_RUNNING:
+                if st.button("🛑 ZASTAVIT PROCES", use_container_width=True):
+                    job_manager.stop(job_id)
+                    st.rerun()
+            elif job_status in JOB_RESUMABLE:
+                if st.button("▶️ POKRAČOVAT", type="primary", use_container_width=True):
+                    start_harvest_job(job_id)
+                    st.rerun()
+                if st.button("⬅️ Zpět na výběr", use_container_width=True):
+                    st.session_state.harvester_phase = "selection" if st.session_state.found_tickets else "filter"
+                    st.rerun()
+
+        if job_status == JOB_FINISHED:
+            # HOTOVO -> PŘECHOD NA VÝSLEDKY
+            anon_pool = get_anonymization_pool() if job_params.get('anon_mode') == MODE_PRESIDIO else None
+            if anon_pool and anon_pool.load_seconds() is not None: mark_startup("model_load_s", anon_pool.load_seconds())
+            export = load_job_export(job_id)
+            st.session_state.stats = {"tickets": export["tickets"], "activities": export["activities"], "size": f"{export['size_bytes'] / 1024:.1f} KB"}
+            st.session_state.export = export
+            st.session_state.harvester_phase = "results" # PŘECHOD
+            st.rerun()
+        elif job_status in (JOB_RUNNING, JOB_STOPPING, JOB_EXPORTING):
+            time.sleep(JOB_POLL_SECONDS)
+            st.rerun()
 
     # -------------------------------------------------------------------------
     # FÁZE 4: VÝSLEDKY
@@ -484,10 +570,8 @@ elif st.session_state.current_app == "harvester":
         st.divider()
         st.success("🎉 Těžba dokončena!")
         
-        st.info(f"**Použitý filtr:**\n\n"
-                f"📅 **Období:** {st.session_state.filter_date_from.strftime('%d.%m.%Y')} - {st.session_state.filter_date_to.strftime('%d.%m.%Y')}\n\n"
-                f"📂 **Kategorie:** {next((k for k,v in cat_options_map.items() if v == st.session_state.selected_cat_key), 'VŠE')}\n\n"
-                f"🏷️ **Status:** {next((k for k,v in stat_options_map.items() if v == st.session_state.selected_stat_key), 'VŠE')}")
+        job_params = get_job_manager().params(st.session_state.get('job_id')) if st.session_state.get('job_id') else {}
+        st.info(f"**Použitý filtr:**\n\n{job_params.get('filter_desc', '')}")
 
         s = st.session_state.stats
         c1, c2, c3 = st.columns(3)
@@ -497,21 +581,43 @@ elif st.session_state.current_app == "harvester":
 
         st.write("")
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        c_name = "VSE" if st.session_state.selected_cat_key == "ALL" else slugify(next((k for k,v in cat_options_map.items() if v == st.session_state.selected_cat_key), "cat"))
-        s_name = "VSE" if st.session_state.selected_stat_key == "ALL" else slugify(next((k for k,v in stat_options_map.items() if v == st.session_state.selected_stat_key), "stat"))
-        file_name_data = f"data_{c_name}_{s_name}_{ts}.json"
-        file_name_ids = f"tickets_{c_name}_{s_name}_{ts}.txt"
-        json_data = json.dumps(st.session_state.export_data, ensure_ascii=False, indent=2)
+        file_tag = job_params.get('file_tag', "VSE_VSE")
+        file_name_data = f"data_{file_tag}_{ts}.json"
+        file_name_ids = f"tickets_{file_tag}_{ts}.txt"
+        export = st.session_state.export
+        if not os.path.exists(export["json_path"]) and st.session_state.get('job_id'):
+            # Soubory mezitím uklidil úklid exportů -> znovu z checkpointu jobu
+            export = st.session_state.export = load_job_export(st.session_state['job_id'])
         
         col_dl1, col_dl2 = st.columns(2)
-        with col_dl1: st.download_button(label="💾 STÁHNOUT JSON DATA", data=json_data, file_name=file_name_data, mime="application/json", use_container_width=True)
-        with col_dl2: st.download_button(label="🆔 STÁHNOUT SEZNAM ID", data=st.session_state.id_list_txt, file_name=file_name_ids, use_container_width=True)
+        with col_dl1: export_download(export["json_path"], "JSON", "💾 STÁHNOUT JSON DATA", file_name_data, mime="application/json")
+        with col_dl2, open(export["ids_path"], "rb") as f: st.download_button(label="🆔 STÁHNOUT SEZNAM ID", data=f, file_name=file_name_ids, use_container_width=True)
+        if export.get("parquet_path") or export.get("csv_path"):
+            col_dl3, col_dl4 = st.columns(2)
+            if export.get("parquet_path"):
+                with col_dl3: export_download(export["parquet_path"], "Parquet", "🧱 STÁHNOUT PARQUET (ZIP)", f"data_{file_tag}_{ts}_parquet.zip", mime="application/zip")
+            if export.get("csv_path"):
+                csv_suffix = export["csv_path"][export["csv_path"].index(".csv"):]
+                with col_dl4: export_download(export["csv_path"], "CSV", "📄 STÁHNOUT CSV", f"data_{file_tag}_{ts}{csv_suffix}")
+
+        job_metrics = get_job_manager().state(st.session_state['job_id']).get("metrics") if st.session_state.get('job_id') else None
+        if job_metrics:
+            with st.expander("📊 Výkon po fázích"):
+                st.dataframe(summary_rows(job_metrics), hide_index=True, use_container_width=True)
+                col_m1, col_m2 = st.columns(2)
+                with col_m1, open(get_job_manager().report_path(st.session_state['job_id']), "rb") as f: st.download_button(label="📊 Report běhu (JSON)", data=f, file_name=f"report_{file_tag}_{ts}.json", mime="application/json", use_container_width=True)
+                with col_m2: st.download_button(label="📈 OpenMetrics", data=to_openmetrics(job_metrics), file_name=f"metrics_{file_tag}_{ts}.txt", mime="text/plain", use_container_width=True)
 
         st.write("")
         if st.button("🔄 Začít znovu / Nová analýza", type="primary", use_container_width=True):
             st.session_state.harvester_phase = "filter" # RESET NA ZAČÁTEK
+            st.session_state.pop('job_id', None)
+            st.query_params.clear()
             st.rerun()
 
         st.markdown("**Náhled dat (první ticket):**")
-        preview = json.dumps(st.session_state.export_data[0] if st.session_state.export_data else {}, ensure_ascii=False, indent=2)
+        preview = json.dumps(export["preview"] or {}, ensure_ascii=False, indent=2)
         st.code(preview, language="json")
+
+# Konec prvního úplného běhu skriptu (zaznamená se jen při studeném startu)
+mark_startup("first_render_s")
@@ -0,0 +1,252 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from daktela_engine import evict_cache, process_tickets
+from daktela_export import ExportWriter
+from daktela_metrics import RunMetrics, write_report
+
+# --- BACKGROUND JOBY TĚŽBY ---
+# Těžba běží ve vlákně mimo běh Streamlit skriptu, takže přežije rerun i zavření záložky.
+# Stav jobu je na disku (adresář jobu):
+#   job.json      - parametry + seznam ticketů ke zpracování (vstup, kvůli obnovení po restartu)
+#   state.json    - průběh (status, počty, ETA, chyba, handle exportu, souběžnost klienta); UI ho jen čte
+#   results.jsonl - checkpoint: jeden hotový ticket na řádek, zapisuje se průběžně
+#   report.json   - metriky posledního běhu (časy fází, HTTP), zapisuje se po skončení běhu
+# Přerušený job (stop, pád procesu) pokračuje od posledního dokončeného ticketu.
+
+JOBS_DIR = os.path.join(tempfile.gettempdir(), "daktela_jobs")
+JOB_MAX_AGE_DAYS = 7
+STATE_SAVE_INTERVAL = 1.0
+# ID jobu = název adresáře (RRRRMMDD_HHMMSS_hex6); přichází i z URL (?job=) -> před použitím v cestě se ověřuje
+JOB_ID_RE = re.compile(r'[0-9]{8}_[0-9]{6}_[0-9a-f]{6}')
+
+STATUS_RUNNING = "running"
+STATUS_STOPPING = "stopping"
+STATUS_STOPPED = "stopped"
+STATUS_INTERRUPTED = "interrupted"
+STATUS_EXPORTING = "exporting"
+STATUS_FINISHED = "finished"
+STATUS_FAILED = "failed"
+RESUMABLE_STATUSES = {STATUS_STOPPED, STATUS_INTERRUPTED, STATUS_FAILED}
+
+
+def _write_json(path, data):
+    # Atomický zápis - UI nikdy nepřečte napůl zapsaný soubor; dočasný soubor je pro každý zápis jiný
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f: json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+
+
+def _read_json(path, default=None):
+    try:
+        with open(path, encoding="utf-8") as f: return json.load(f)
+    except (OSError, ValueError): return default
+
+
+def valid_job_id(job_id):
+    return isinstance(job_id, str) and JOB_ID_RE.fullmatch(job_id) is not None
+
+
+class JobManager:
+    def __init__(self, jobs_dir=JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        os.makedirs(jobs_dir, exist_ok=True)
+        self.threads = {}
+        self.stop_events = {}
+        self.lock = threading.Lock()
+
+    def job_dir(self, job_id):
+        if not valid_job_id(job_id): raise ValueError(f"Neplatné ID jobu: {job_id!r}")
+        return os.path.join(self.jobs_dir, job_id)
+
+    # --- ZALOŽENÍ A STAV ---
+    def create(self, tickets, params):
+        # params: nastavení těžby (workers, force_refresh, anon_mode, export_formats, ...) + popis filtru pro UI
+        self.purge()
+        job_id = datetime.now().strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
+        os.makedirs(self.job_dir(job_id))
+        _write_json(os.path.join(self.job_dir(job_id), "job.json"), {"params": params, "tickets": tickets})
+        self._save_state(job_id, {"status": STATUS_STOPPED, "total": len(tickets), "processed": 0, "written": 0, "created": time.time()})
+        return job_id
+
+    def exists(self, job_id):
+        return valid_job_id(job_id) and os.path.exists(os.path.join(self.job_dir(job_id), "state.json"))
+
+    def params(self, job_id):
+        return (_read_json(os.path.join(self.job_dir(job_id), "job.json"), {}) or {}).get("params", {})
+
+    def state(self, job_id):
+        # Živost před čtením: vlákno, které právě doběhlo, už má v souboru konečný stav
+        alive = self.is_alive(job_id)
+        state = _read_json(os.path.join(self.job_dir(job_id), "state.json"), {}) or {}
+        # Běžící stav bez živého vlákna = proces aplikace mezitím skončil
+        if state.get("status") in (STATUS_RUNNING, STATUS_STOPPING, STATUS_EXPORTING) and not alive:
+            state["status"] = STATUS_INTERRUPTED
+        # Zastavení vyžádané z UI, které vlákno jobu ještě nezapsalo
+        elif state.get("status") == STATUS_RUNNING and self.stop_events.get(job_id) and self.stop_events[job_id].is_set():
+            state["status"] = STATUS_STOPPING
+        return state
+
+    def report_path(self, job_id):
+        return os.path.join(self.job_dir(job_id), "report.json")
+
+    def _save_state(self, job_id, state):
+        _write_json(os.path.join(self.job_dir(job_id), "state.json"), state)
+
+    def list_jobs(self):
+        jobs = []
+        for job_id in sorted(os.listdir(self.jobs_dir), reverse=True):
+            if self.exists(job_id): jobs.append((job_id, self.state(job_id)))
+        return jobs
+
+    def purge(self, max_age_days=JOB_MAX_AGE_DAYS):
+        cutoff = time.time() - max_age_days * 86400
+        for job_id in filter(valid_job_id, os.listdir(self.jobs_dir)):
+            path = self.job_dir(job_id)
+            if not self.is_alive(job_id) and os.path.getmtime(path) < cutoff: shutil.rmtree(path, ignore_errors=True)
+
+    # --- ŘÍZENÍ ---
+    def is_alive(self, job_id):
+        thread = self.threads.get(job_id)
+        return thread is not None and thread.is_alive()
+
+    def start(self, job_id, client, cache, anonymizer):
+        # Spustí nebo obnoví job; už zpracované tickety (results.jsonl) se přeskočí
+        with self.lock:
+            if self.is_alive(job_id): return False
+            stop_event = threading.Event()
+            thread = threading.Thread(target=self._run, args=(job_id, stop_event, client, cache, anonymizer), name=f"daktela-job-{job_id}", daemon=True)
+            self.stop_events[job_id] = stop_event
+            self.threads[job_id] = thread
+            thread.start()
+            return True
+
+    def stop(self, job_id):
+        # Zastaví job po dokončení rozpracovaného ticketu; hotová práce zůstává v checkpointu.
+        # state.json zapisuje jen vlákno jobu (STOPPING zapíše při dalším ticketu), UI jen nastaví událost
+        event = self.stop_events.get(job_id)
+        if event and self.is_alive(job_id): event.set()
+
+    def completed(self, job_id):
+        # Čísla ticketů v checkpointu; poškozený poslední řádek (pád při zápisu) se ignoruje
+        done = set()
+        path = os.path.join(self.job_dir(job_id), "results.jsonl")
+        if not os.path.exists(path): return done
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try: done.add(str(json.loads(line)["ticket_number"]))
+                except (ValueError, KeyError): pass
+        return done
+
+    # --- BĚH (vlákno) ---
+    def _run(self, job_id, stop_event, client, cache, anonymizer):
+        job = _read_json(os.path.join(self.job_dir(job_id), "job.json"))
+        params, tickets = job["params"], job["tickets"]
+        state = self.state(job_id)
+        results_path = os.path.join(self.job_dir(job_id), "results.jsonl")
+        # Metriky jsou za tento běh (po obnovení začínají znovu); snapshot jde do state.json pro živé UI.
+        # Klient je sdílený -> pozorovatel jen na požadavky z vlákna jobu a jeho fetch vláken
+        metrics = RunMetrics()
+        client.add_observer(metrics.observe_http, scoped=True)
+        try:
+            self._truncate_torn_line(results_path)
+            done = self.completed(job_id)
+            remaining = [t for t in tickets if str(t.get('name')) not in done]
+            run_started, last_save = time.time(), 0.0
+            state.update(status=STATUS_RUNNING, total=len(tickets), processed=len(tickets) - len(remaining), written=len(done), error=None, current=None, eta_seconds=None, started=run_started)
+            self._save_state(job_id, state)
+            base_processed = state["processed"]
+
+            def on_fetched(idx, t_obj):
+                nonlocal last_save
+                state.update(processed=base_processed + idx + 1, current=t_obj.get('name'))
+                if idx > 0: state["eta_seconds"] = (time.time() - run_started) / (idx + 1) * (len(remaining) - (idx + 1))
+                stopping = stop_event.is_set() and state["status"] == STATUS_RUNNING
+                if stopping: state["status"] = STATUS_STOPPING
+                if stopping or time.time() - last_save >= STATE_SAVE_INTERVAL:
+                    last_save = time.time()
+                    state["metrics"] = metrics.snapshot()
+                    if client.concurrency: state["concurrency"] = client.concurrency.snapshot()
+                    self._save_state(job_id, state)
+
+            with open(results_path, "a", encoding="utf-8") as out:
+                for entry in process_tickets(client, cache, anonymizer, remaining, params.get("workers"), stop_event, params.get("force_refresh", False), on_fetched=on_fetched, metrics=metrics, diff_mode=params.get("diff_mode", False), activity_types=params.get("activity_types")):
+                    out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    out.flush()
+                    state["written"] += 1
+            evict_cache(cache, metrics)
+            if stop_event.is_set():
+                state.update(status=STATUS_STOPPED, eta_seconds=None)
+                return
+
+            state.update(status=STATUS_EXPORTING, eta_seconds=None, metrics=metrics.snapshot())
+            self._save_state(job_id, state)
+            with metrics.timer("export_seconds"): export = self._build_export(job_id, tickets, params)
+            state.update(status=STATUS_FINISHED, export=export, finished=time.time())
+        except Exception as e:
+            state.update(status=STATUS_FAILED, error=f"{type(e).__name__}: {e}")
+        finally:
+            client.remove_observer(metrics.observe_http)
+            state["metrics"] = metrics.snapshot()
+            if client.concurrency: state["concurrency"] = client.concurrency.snapshot()
+            write_report(self.report_path(job_id), state["metrics"], job_id=job_id, status=state.get("status"), total=state.get("total"), written=state.get("written"), params=params, concurrency=state.get("concurrency"))
+            self._save_state(job_id, state)
+
+    def ensure_export(self, job_id):
+        # Export dokončeného jobu; smazané soubory (úklid exportů po 24 h, nový job v relaci) se sestaví znovu z checkpointu
+        state = self.state(job_id)
+        export = state.get("export")
+        if export and all(os.path.exists(export[k]) for k in ("json_path", "ids_path", "parquet_path", "csv_path") if export.get(k)): return export
+        job = _read_json(os.path.join(self.job_dir(job_id), "job.json"))
+        state["export"] = self._build_export(job_id, job["tickets"], job["params"])
+        self._save_state(job_id, state)
+        return state["export"]
+
+    def _build_export(self, job_id, tickets, params):
+        # Export v pořadí ticketů (po obnovení mohou být v checkpointu přeházené) - přes offsety řádků
+        results_path = os.path.join(self.job_dir(job_id), "results.jsonl")
+        offsets = {}
+        with open(results_path, "rb") as f:
+            pos = f.tell()
+            for line in iter(f.readline, b""):
+                try: offsets.setdefault(str(json.loads(line)["ticket_number"]), pos)
+                except (ValueError, KeyError): pass
+                pos = f.tell()
+        comp = params.get("export_compression", {})
+        writer = ExportWriter(formats=params.get("export_formats", []), parquet_compression=comp.get("parquet", "zstd"), csv_compression=comp.get("csv", "gzip"))
+        try:
+            with open(results_path, "rb") as f:
+                for t in tickets:
+                    pos = offsets.get(str(t.get('name')))
+                    if pos is None: continue
+                    f.seek(pos)
+                    writer.write(json.loads(f.readline()))
+            return writer.close()
+        except BaseException:
+            # Nedokončený export nesmí zůstat v adresáři exportů (job skončí jako failed, obnovou se sestaví znovu)
+            writer.discard()
+            raise
+
+    @staticmethod
+    def _truncate_torn_line(path):
+        # Po pádu uprostřed zápisu může poslední řádek chybět jen zčásti -> odříznout
+        if not os.path.exists(path) or os.path.getsize(path) == 0: return
+        with open(path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n": return
+            f.seek(0)
+            data = f.read()
+            f.seek(0)
+            f.truncate(data.rfind(b"\n") + 1)
@@ -0,0 +1,138 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# --- METRIKY BĚHU TĚŽBY ---
+# Časy a počty po fázích (stahování, čištění, anonymizace, ...) + HTTP po endpointech.
+# Rozdělení: count/sum/max přesně, percentily z rezervoáru pevné velikosti (paměť nezávisí na délce běhu).
+# Názvy rozdělení nesou jednotku: *_seconds = čas, ostatní = počet (např. activities_per_ticket).
+# Výstup: snapshot() -> dict (UI, JSON report), to_openmetrics() -> text pro monitoring.
+
+RESERVOIR_SIZE = 10000
+PERCENTILES = (50, 95, 99)
+OPENMETRICS_PREFIX = "daktela_harvest"
+
+
+class Distribution:
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, value, rnd):
+        self.count += 1
+        self.total += value
+        if value > self.max: self.max = value
+        if len(self.samples) < RESERVOIR_SIZE: self.samples.append(value)
+        else:
+            j = rnd.randrange(self.count)
+            if j < RESERVOIR_SIZE: self.samples[j] = value
+
+    def summary(self):
+        s = sorted(self.samples)
+        out = {"count": self.count, "sum": self.total, "mean": self.total / self.count if self.count else 0.0, "max": self.max}
+        # Percentil metodou nejbližšího pořadí
+        for p in PERCENTILES: out[f"p{p}"] = s[max(0, math.ceil(p / 100 * len(s)) - 1)] if s else 0.0
+        return out
+
+
+class RunMetrics:
+    def __init__(self):
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.rnd = random.Random(0)
+        self.dists = {}
+        self.counters = {}
+        self.http = {}
+
+    def observe(self, name, value):
+        with self.lock:
+            dist = self.dists.get(name)
+            if dist is None: dist = self.dists[name] = Distribution()
+            dist.add(value, self.rnd)
+
+    def count(self, name, n=1):
+        with self.lock: self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def timer(self, name):
+        started = time.perf_counter()
+        try: yield
+        finally: self.observe(name, time.perf_counter() - started)
+
+    def observe_http(self, endpoint, latency, size=0, wire_size=0, error=False, retry=False):
+        # Podpis odpovídá pozorovateli DaktelaClient.add_observer
+        with self.lock:
+            h = self.http.get(endpoint)
+            if h is None: h = self.http[endpoint] = {"requests": 0, "errors": 0, "retries": 0, "bytes": 0, "wire_bytes": 0, "latency": Distribution()}
+            h["requests"] += 1
+            h["bytes"] += size
+            h["wire_bytes"] += wire_size
+            if error: h["errors"] += 1
+            if retry: h["retries"] += 1
+            h["latency"].add(latency, self.rnd)
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.time() - self.started
+            counters = dict(self.counters)
+            return {"started": self.started, "elapsed_s": elapsed, "counters": counters,
+                    "rates": {f"{k}_per_s": counters.get(k, 0) / elapsed if elapsed > 0 else 0.0 for k in ("tickets", "activities")},
+                    "stages": {name: dist.summary() for name, dist in sorted(self.dists.items())},
+                    "http": {ep: dict({k: v for k, v in h.items() if k != "latency"}, latency_seconds=h["latency"].summary()) for ep, h in sorted(self.http.items())}}
+
+
+def summary_rows(snapshot):
+    # Řádky tabulky pro UI / log: časy v ms, počty tak, jak jsou
+    rows = []
+    stages = dict(snapshot.get("stages", {}))
+    stages.update({f"http {ep}": h["latency_seconds"] for ep, h in snapshot.get("http", {}).items()})
+    for name, s in stages.items():
+        timing = name.endswith("_seconds") or name.startswith("http ")
+        fmt = (lambda v: round(v * 1000, 1)) if timing else (lambda v: round(v, 1))
+        rows.append({"fáze": name.removesuffix("_seconds") + (" [ms]" if timing else ""), "počet": s["count"], "celkem": round(s["sum"], 2) if timing else s["sum"],
+                     "p50": fmt(s["p50"]), "p95": fmt(s["p95"]), "p99": fmt(s["p99"]), "max": fmt(s["max"])})
+    return rows
+
+
+def write_report(path, snapshot, **extra):
+    # JSON report běhu (atomicky - čte ho i UI)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f: json.dump(dict(extra, metrics=snapshot), f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _summary_lines(name, s, labels=""):
+    quantile_labels = f"{labels}," if labels else ""
+    plain_labels = f"{{{labels}}}" if labels else ""
+    lines = [f'{name}{{{quantile_labels}quantile="{p / 100}"}} {s[f"p{p}"]}' for p in PERCENTILES]
+    return lines + [f"{name}_sum{plain_labels} {s['sum']}", f"{name}_count{plain_labels} {s['count']}"]
+
+
+def to_openmetrics(snapshot, prefix=OPENMETRICS_PREFIX):
+    lines = []
+    for name, value in sorted(snapshot.get("counters", {}).items()):
+        lines += [f"# TYPE {prefix}_{name} counter", f"{prefix}_{name}_total {value}"]
+    for name, s in snapshot.get("stages", {}).items():
+        lines.append(f"# TYPE {prefix}_{name} summary")
+        lines += _summary_lines(f"{prefix}_{name}", s)
+    http = snapshot.get("http", {})
+    if http:
+        for field in ("requests", "errors", "retries", "bytes", "wire_bytes"):
+            lines.append(f"# TYPE {prefix}_http_{field} counter")
+            lines += [f'{prefix}_http_{field}_total{{endpoint="{_label(ep)}"}} {h[field]}' for ep, h in http.items()]
+        lines.append(f"# TYPE {prefix}_http_latency_seconds summary")
+        for ep, h in http.items(): lines += _summary_lines(f"{prefix}_http_latency_seconds", h["latency_seconds"], f'endpoint="{_label(ep)}"')
+    lines += [f"# TYPE {prefix}_elapsed_seconds gauge", f"{prefix}_elapsed_seconds {snapshot.get('elapsed_s', 0.0)}", "# EOF"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,223 @@
+import argparse
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# --- MOCK DAKTELA SERVER ---
+# Syntetické odpovědi /api/v6/ pro benchmarky a ladění bez produkční Daktely:
+#   tickets.json (take/skip, total, filtry created/category/statuses), tickets/{name}/activities.json
+#   (projekce fields[], filtr type), ticketsCategories.json, statuses.json.
+# Data jsou deterministická (seed), velikost, latence a chybovost jsou nastavitelné.
+# --capacity N simuluje přetížení: latence roste se souběžnými požadavky, nad N odpovídá 429 + Retry-After.
+# Spuštění: python daktela_mock.py --port 8765 --tickets 5000 --latency-ms 40 --error-rate 0.02
+#           DAKTELA_URL=http://127.0.0.1:8765 DAKTELA_TOKEN=x python daktela_cli.py harvest --from 2024-01-01
+
+API_PREFIX = "/api/v6/"
+START_DATE = datetime(2024, 1, 1, 8, 0, 0)
+CATEGORIES = [("cat_reklamace", "Reklamace"), ("cat_dotaz", "Dotaz"), ("cat_svoz", "Svoz"), ("cat_api", "API integrace")]
+STATUSES = [("st_open", "Otevřený"), ("st_wait", "Čeká na dopravce"), ("st_closed", "Uzavřený")]
+CARRIER_DOMAINS = ["ppl.cz", "dpd.cz", "gls.cz", "cp.cz", "zasilkovna.cz", "ups.com", "dhl.com"]
+CLIENT_DOMAINS = ["eshop.cz", "obchod.sk", "firma.cz", "seznam.cz", "gmail.com"]
+AUTO_REPLY = "<p>Potvrzujeme, že Vaše zpráva byla úspěšně doručena. Odpovíme Vám co nejdříve.</p><p>Tým podpory Balíkobot</p>"
+SENTENCES = [
+    "Dobrý den, zásilka stále nebyla doručena, prosím o prověření.",
+    "Kurýr dnes nedorazil, zákazník čekal celý den doma.",
+    "Posíláme reklamaci poškozeného balíku, fotografie jsou v příloze.",
+    "Prosím o změnu adresy doručení u objednávky.",
+    "Děkujeme za informaci, stav budeme dále sledovat.",
+    "Svoz byl objednán na zítřek, prosíme o potvrzení.",
+]
+
+
+class MockData:
+    def __init__(self, tickets=1000, activities=5, text_size=800, seed=1):
+        self.n_tickets = tickets
+        self.activities = activities
+        self.text_size = text_size
+        self.seed = seed
+        # Tickety jsou malé -> drží se celé; aktivity se generují až na požadavek (deterministicky)
+        rnd = random.Random(seed)
+        self.tickets = [self._ticket(i, rnd) for i in range(tickets)]
+        self.by_name = {t["name"]: i for i, t in enumerate(self.tickets)}
+
+    def _ticket(self, i, rnd):
+        created = START_DATE + timedelta(minutes=37 * i)
+        cat, stat = rnd.choice(CATEGORIES), rnd.choice(STATUSES)
+        return {"name": str(100000 + i), "title": f"{rnd.choice(['Reklamace', 'Dotaz', 'Nedoručeno', 'Svoz'])} {100000 + i}",
+                "created": created.strftime('%Y-%m-%d %H:%M:%S'), "edited": (created + timedelta(hours=rnd.randint(1, 72))).strftime('%Y-%m-%d %H:%M:%S'),
+                "category": {"name": cat[0], "title": cat[1]}, "statuses": [{"name": stat[0], "title": stat[1]}],
+                "customFields": {"vip": ["→ VIP KLIENT ←"] if rnd.random() < 0.1 else [], "eshop": [f"eshop{rnd.randint(1, 500)}"]},
+                "user": {"name": "agent", "title": "Agent Podpory"}, "description": "x" * 200}
+
+    def search(self, params):
+        # Podmnožina filtrů, které posílá harvester (build_search_params)
+        filters = {}
+        for key, value in params.items():
+            m = re.match(r'filter\[filters\]\[(\d+)\]\[(field|operator|value)\]', key)
+            if m: filters.setdefault(m.group(1), {})[m.group(2)] = value
+        data = self.tickets
+        for f in filters.values():
+            field, op, value = f.get("field"), f.get("operator"), f.get("value")
+            if field == "created" and op == "gte": data = [t for t in data if t["created"] >= value]
+            elif field == "created" and op == "lte": data = [t for t in data if t["created"] <= value]
+            elif field == "category": data = [t for t in data if t["category"]["name"] == value]
+            elif field == "statuses": data = [t for t in data if t["statuses"][0]["name"] == value]
+        skip, take = int(params.get("skip", 0)), int(params.get("take", 1000))
+        return data[skip:skip + take], len(data)
+
+    @staticmethod
+    def project(rows, params):
+        # fields[N]=pole -> jen vyjmenovaná pole nejvyšší úrovně (jako Daktela)
+        fields = [v for k, v in params.items() if k.startswith("fields[")]
+        return [{k: r[k] for k in fields if k in r} for r in rows] if fields else rows
+
+    @staticmethod
+    def filter_types(acts, params):
+        types = {v for k, v in params.items() if k.startswith("filter[filters]") and k.endswith("[value]")}
+        return [a for a in acts if a["type"] in types] if types else acts
+
+    def activities_for(self, name):
+        i = self.by_name.get(name)
+        if i is None: return None
+        rnd = random.Random(self.seed * 1000003 + i)
+        ticket_time = datetime.strptime(self.tickets[i]["created"], '%Y-%m-%d %H:%M:%S')
+        count = max(0, int(rnd.gauss(self.activities, self.activities / 2)))
+        acts, history = [], []
+        for a in range(count):
+            incoming = rnd.random() < 0.5
+            carrier = rnd.random() < 0.3
+            address = f"info@{rnd.choice(CARRIER_DOMAINS)}" if carrier else f"zakaznik{rnd.randint(1, 999)}@{rnd.choice(CLIENT_DOMAINS)}"
+            acts.append({"name": f"act_{name}_{a}", "time": (ticket_time + timedelta(minutes=13 * a)).strftime('%Y-%m-%d %H:%M:%S'),
+                         "type": rnd.choice(["EMAIL", "EMAIL", "EMAIL", "COMMENT", "CALL"]),
+                         "user": {"name": "agent", "title": "Agent Podpory", "email": "podpora@balikobot.cz"},
+                         "contact": {"name": f"c{i}", "title": "Dopravce" if carrier else f"Zákazník {rnd.randint(1, 999)}", "email": address},
+                         "item": {"direction": "in" if incoming else "out", "address": address, "text": self._html(rnd, history)},
+                         "description": "", "queue": {"name": "email", "title": "E-mail", "description": "Fronta e-mailové podpory"},
+                         # Pole, která harvester nečte (plný ticket, záznamy) - ušetří je projekce fields[]
+                         "ticket": self.tickets[i], "record": {"name": f"rec_{name}_{a}", "form": {"note": "x" * 150}}})
+        return acts
+
+    def _html(self, rnd, history):
+        # HTML e-mail cílové velikosti: text s PII, podpis, u odpovědí citovaná historie vlákna -
+        # buď pod hlavičkou "From:" (usekne ji čištění), nebo jen odsazená "> " (zachytí až diff režim).
+        # Část zpráv jsou stejné automatické odpovědi.
+        if history and rnd.random() < 0.1: return AUTO_REPLY
+        lines = []
+        while sum(len(p) for p in lines) < self.text_size * 0.6:
+            lines.append(f"{rnd.choice(SENTENCES)} (ref. {rnd.randint(1000, 99999)})")
+        lines.insert(rnd.randint(0, len(lines)), f"Kontakt: +420 {rnd.randint(601, 799)} {rnd.randint(100, 999)} {rnd.randint(100, 999)}, jan.novak{rnd.randint(1, 99)}@{rnd.choice(CLIENT_DOMAINS)}")
+        body = "".join(f"<p>{line}</p>" for line in lines) + ("<div>S pozdravem<br>Jan Novák</div>" if rnd.random() < 0.5 else "")
+        if history:
+            quoted = [line for previous in reversed(history) for line in previous]
+            if rnd.random() < 0.5: body += f"<div>From: jan.novak@{rnd.choice(CLIENT_DOMAINS)}<br>Sent: pondělí</div><blockquote>{''.join(f'<p>{q}</p>' for q in quoted)}</blockquote>"
+            else: body += "".join(f"<p>&gt; {q}</p>" for q in quoted)
+        history.append(lines)
+        return f"<html><head><style>p {{ margin: 0; }}</style></head><body>{body}</body></html>"
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args): pass
+
+    def _send(self, status, payload=None, headers=None):
+        body = json.dumps(payload if payload is not None else {"error": status}, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items(): self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.active += 1
+            active = self.server.active
+        try: self._handle(active)
+        finally:
+            with self.server.lock: self.server.active -= 1
+
+    def _handle(self, active):
+        cfg = self.server.config
+        if cfg["capacity"] and active > cfg["capacity"]: return self._send(429, headers={"Retry-After": str(cfg["retry_after"])})
+        # Fronta na serveru: nad polovinou kapacity latence roste se zátěží
+        load = max(1.0, 2 * active / cfg["capacity"]) if cfg["capacity"] else 1.0
+        if cfg["latency"] or cfg["jitter"]: time.sleep((cfg["latency"] + random.uniform(0, cfg["jitter"])) * load)
+        if cfg["error_rate"] and random.random() < cfg["error_rate"]:
+            # Polovina chyb jako throttling s Retry-After, polovina jako výpadek
+            if random.random() < 0.5: return self._send(429, headers={"Retry-After": str(cfg["retry_after"])})
+            return self._send(503)
+        url = urlparse(self.path)
+        path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else None
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        data = self.server.data
+        if path == "tickets.json":
+            rows, total = data.search(params)
+            return self._send(200, {"result": {"data": rows, "total": total}})
+        if path == "ticketsCategories.json": return self._send(200, {"result": {"data": [{"name": n, "title": t} for n, t in CATEGORIES], "total": len(CATEGORIES)}})
+        if path == "statuses.json": return self._send(200, {"result": {"data": [{"name": n, "title": t} for n, t in STATUSES], "total": len(STATUSES)}})
+        m = re.fullmatch(r'tickets/([^/]+)/activities\.json', path or "")
+        if m:
+            acts = data.activities_for(m.group(1))
+            if acts is None: return self._send(404)
+            acts = data.project(data.filter_types(acts, params), params)
+            return self._send(200, {"result": {"data": acts, "total": len(acts)}})
+        self._send(404)
+
+
+def make_server(host="127.0.0.1", port=0, tickets=1000, activities=5, text_size=800, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, retry_after=0, capacity=0, seed=1):
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.data = MockData(tickets, activities, text_size, seed)
+    server.config = {"latency": latency_ms / 1000, "jitter": jitter_ms / 1000, "error_rate": error_rate, "retry_after": retry_after, "capacity": capacity}
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.active = 0
+    return server
+
+
+def _serve(ready, kwargs):
+    server = make_server(**kwargs)
+    ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_mock_process(**kwargs):
+    # Server v samostatném procesu (neovlivní měření CPU/RSS benchmarku); vrací (proces, base_url)
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    proc = ctx.Process(target=_serve, args=(ready, kwargs), daemon=True)
+    proc.start()
+    port = ready.get(timeout=60)
+    return proc, f"http://{kwargs.get('host', '127.0.0.1')}:{port}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Daktela API se syntetickými daty")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tickets", type=int, default=1000)
+    parser.add_argument("--activities", type=float, default=5, help="průměrný počet aktivit na ticket")
+    parser.add_argument("--text-size", type=int, default=800, help="přibližná délka HTML aktivity (znaky)")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="podíl odpovědí 429/503")
+    parser.add_argument("--retry-after", type=int, default=0, help="Retry-After u odpovědí 429 (s)")
+    parser.add_argument("--capacity", type=int, default=0, help="max souběžných požadavků, nad tím 429 (0 = bez omezení)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = vars(parser.parse_args(argv))
+    server = make_server(**args)
+    print(f"Mock Daktela na http://{args['host']}:{server.server_address[1]} ({args['tickets']} ticketů)")
+    try: server.serve_forever()
+    except KeyboardInterrupt: pass
+
+
+if __name__ == "__main__":
+    main()
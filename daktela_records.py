@@ -0,0 +1,73 @@
+import sys
+from functools import cached_property
+
+# --- KOMPAKTNÍ VÝSLEDKY HLEDÁNÍ ---
+# Místo surových ticketů z API (customFields, vnořené category/statuses, ...) se v relaci a ve sdílené
+# cache drží jen to, co zpracování potřebuje. Opakující se texty (kategorie, statusy) jsou internované.
+# to_api() vrací minimální dict ve tvaru API, ze kterého prepare_ticket spočítá totéž co ze surového ticketu.
+
+VIP_MARK = "→ VIP KLIENT ←"
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class TicketRecord:
+    __slots__ = ("name", "title", "created", "edited", "category_key", "category_title", "status_title", "vip")
+
+    def __init__(self, name, title, created, edited, category_key, category_title, status_title, vip):
+        self.name = name
+        self.title = title
+        self.created = created
+        self.edited = edited
+        self.category_key = category_key
+        self.category_title = category_title
+        self.status_title = status_title
+        self.vip = vip
+
+    @classmethod
+    def from_api(cls, t):
+        # Výchozí hodnoty stejně jako prepare_ticket ('Bez předmětu', 'N/A')
+        category = t.get('category')
+        statuses = t.get('statuses')
+        status_title = statuses[0].get('title', 'N/A') if isinstance(statuses, list) and statuses else "N/A"
+        vip = VIP_MARK in ((t.get('customFields') or {}).get('vip') or [])
+        return cls(t.get('name'), t.get('title', 'Bez předmětu'), t.get('created'), t.get('edited'),
+                   _intern(category.get('name')) if category else None, _intern(category.get('title', 'N/A')) if category else "N/A",
+                   _intern(status_title), vip)
+
+    def to_api(self):
+        t = {"name": self.name, "title": self.title, "created": self.created, "edited": self.edited,
+             "category": {"name": self.category_key, "title": self.category_title}, "statuses": [{"title": self.status_title}]}
+        if self.vip: t["customFields"] = {"vip": [VIP_MARK]}
+        return t
+
+
+class TicketList:
+    # Seznam záznamů jen pro čtení (sdílí ho více relací); odvozené pohledy se počítají líně a jednou
+    def __init__(self, records=()):
+        self.records = tuple(records)
+
+    @classmethod
+    def from_api(cls, tickets):
+        return cls(TicketRecord.from_api(t) for t in tickets)
+
+    def __len__(self): return len(self.records)
+    def __iter__(self): return iter(self.records)
+    def __getitem__(self, idx): return self.records[idx]
+
+    @cached_property
+    def ids_text(self):
+        return "\n".join(str(r.name or '') for r in self.records)
+
+    def to_api(self, limit=0):
+        # Vstup pro zpracování (job): prvních 'limit' ticketů (0 = všechny)
+        return [r.to_api() for r in (self.records[:limit] if limit > 0 else self.records)]
+
+    def nbytes(self):
+        # Odhad paměti (záznamy + neinternované texty); pro limit sdílené cache hledání
+        size = sys.getsizeof(self.records)
+        for r in self.records:
+            size += sys.getsizeof(r) + sum(sys.getsizeof(v) for v in (r.name, r.title, r.created, r.edited) if v is not None)
+        return size